@@ -1,4 +1,4 @@
-import os, csv
+import os, csv, time, threading
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from typing import Optional
@@ -40,29 +40,46 @@ def _ensure_dirs():
 # Perform a safe one-time ensure at import
 _ensure_dirs()
 
+TEHRAN_TZ = timezone(timedelta(hours=3, minutes=30))
+_stamp_cache = (None, "", "")  # (epoch second, utc str, iran str); replaced whole, never edited
+_csv_lock = threading.Lock()  # main loop and order lane thread both append
+
+def _now_strs():
+    """(utc, iran) time strings for the current second; formatted once per second."""
+    global _stamp_cache
+    sec = int(time.time())
+    stamp = _stamp_cache
+    if stamp[0] != sec:
+        utc = datetime.fromtimestamp(sec, timezone.utc)
+        stamp = (sec, utc.strftime("%Y-%m-%d %H:%M:%S"),
+                 utc.astimezone(TEHRAN_TZ).strftime("%Y-%m-%d %H:%M:%S"))
+        _stamp_cache = stamp
+    return stamp[1], stamp[2]
+
 def _iran_now_str():
-    tehran = timezone(timedelta(hours=3, minutes=30))
-    return datetime.now(tehran).strftime("%Y-%m-%d %H:%M:%S")
+    return _now_strs()[1]
 
 def _utc_now_str():
-    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    return _now_strs()[0]
 
 def _append_csv(fp: Path, headers: list[str], row: dict):
-    file_exists = fp.exists()
-    with fp.open("a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
-        if not file_exists:
-            w.writeheader()
-        w.writerow(row)
+    with _csv_lock:
+        file_exists = fp.exists()
+        with fp.open("a", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
+            if not file_exists:
+                w.writeheader()
+            w.writerow(row)
 
 def log_market(symbol: str, bid: float, ask: float, last: Optional[float], point: float, digits: int, source="mt5", session="bot"):
     # 1 pip = 0.01 for 2/3 digits, else 0.0001
     pip = 0.01 if digits in (2,3) else 0.0001
     spread_points = (ask - bid) / point if (ask and bid and point) else None
     spread_pips = (ask - bid) / pip if (ask and bid) else None
+    dt_utc, dt_iran = _now_strs()
     row = {
-        "dt_utc": _utc_now_str(),
-        "dt_iran": _iran_now_str(),
+        "dt_utc": dt_utc,
+        "dt_iran": dt_iran,
         "symbol": symbol,
         "bid": bid, "ask": ask, "last": last,
         "spread_points": spread_points, "spread_pips": spread_pips,
@@ -78,9 +95,10 @@ def log_market(symbol: str, bid: float, ask: float, last: Optional[float], point
 def log_signal(symbol: str, strategy: str, direction: str, rr: float, entry: float, sl: float, tp: float,
                fib: Optional[dict]=None, confidence: Optional[float]=None, features_json: Optional[str]=None, note: Optional[str]=None):
     fib = fib or {}
+    dt_utc, dt_iran = _now_strs()
     row = {
-        "dt_utc": _utc_now_str(),
-        "dt_iran": _iran_now_str(),
+        "dt_utc": dt_utc,
+        "dt_iran": dt_iran,
         "symbol": symbol, "strategy": strategy, "direction": direction, "rr": rr,
         "entry": entry, "sl": sl, "tp": tp,
         "fib_0": fib.get("0.0"), "fib_0705": fib.get("0.705"), "fib_09": fib.get("0.9"), "fib_1": fib.get("1.0"),
@@ -109,9 +127,10 @@ def log_trade(symbol: str, side: str, request: dict, result, reason: str=""):
     except Exception:
         risk_abs = None
 
+    dt_utc, dt_iran = _now_strs()
     row = {
-        "dt_utc": _utc_now_str(),
-        "dt_iran": _iran_now_str(),
+        "dt_utc": dt_utc,
+        "dt_iran": dt_iran,
         "symbol": symbol, "side": side,
         "req_price": req_price, "req_vol": request.get("volume"),
         "req_deviation": request.get("deviation"), "req_filling": request.get("type_filling"),
@@ -143,9 +162,10 @@ def log_position_event(symbol: str, ticket: int, event: str, direction: str, ent
         "dt_utc","dt_iran","symbol","ticket","event","direction","stage","entry","current_price",
         "sl","tp","risk_abs","profit_R","locked_R","volume","note"
     ]
+    dt_utc, dt_iran = _now_strs()
     row = {
-        "dt_utc": _utc_now_str(),
-        "dt_iran": _iran_now_str(),
+        "dt_utc": dt_utc,
+        "dt_iran": dt_iran,
         "symbol": symbol,
         "ticket": ticket,
         "event": event,
@@ -0,0 +1,138 @@
+import numpy as np
+
+from bar_store import RATES_DTYPE
+from indicators import RollingStats
+
+# (symbol, period_seconds) -> BarAggregator، توسط MT5Connector از جریان M1 پر می‌شود
+_aggregators = {}
+
+
+class BarAggregator:
+    """
+    Builds higher-timeframe bars (M15, H1, ...) incrementally from closed M1
+    bars, so the last completed candle is available without a broker call.
+
+    update() takes the M1 rates buffer (last row = forming bar) and folds in
+    only the closed rows it has not seen. A bucket is completed as soon as
+    the forming M1 bar belongs to a later bucket, which is the same moment
+    the broker opens the next higher-timeframe bar. seed() merges completed
+    bars from the broker (on every M1 buffer load), so the average-range
+    history is available right after startup and a reload gap is filled
+    with the broker's own bars. After a discontinuity in the M1 stream (first
+    load, or a buffer that no longer overlaps the rows already folded in)
+    a bucket that started before the first available M1 row is partial and
+    never reported; completed() returns None while the newest completed
+    bar is missing, so callers fall back to the broker.
+    """
+
+    def __init__(self, period, history=64, stats_window=20):
+        self.period = period
+        self.history = history
+        self.stats_window = stats_window
+        self.stats = RollingStats(stats_window)  # میانگین رنج/بدنه/ATR کندل‌های تکمیل‌شده
+        self.bars = np.empty(0, RATES_DTYPE)  # کندل‌های تکمیل‌شده، قدیمی به جدید
+        self._forming = None
+        self._partial = False
+        self._skipped = set()  # زمان کندل‌های ناقصی که گزارش نشدند (تا بروکر آن‌ها را بدهد)
+        self._last_m1 = 0
+        self.last_seen = 0  # زمان آخرین کندل M1 (در حال تشکیل) دیده‌شده
+
+    def seed(self, rates):
+        """Load completed higher-timeframe bars (e.g. broker rates[:-1])."""
+        if rates is None or len(rates) == 0:
+            return
+        seeded = np.asarray(rates).astype(RATES_DTYPE)
+        if len(self.bars):
+            # کندل‌های بروکر معتبرترند؛ کندل‌های خودمان فقط جایی که بروکر نداده نگه داشته می‌شوند
+            own = self.bars[~np.isin(self.bars['time'], seeded['time'])]
+            seeded = np.concatenate([own, seeded])
+            seeded = seeded[np.argsort(seeded['time'], kind='stable')]
+        self.bars = seeded[-self.history:]
+        # بازه‌ای که بروکر داده دیگر حفره‌ای ندارد
+        broker_last = int(np.asarray(rates)['time'][-1])
+        self._skipped = {t for t in self._skipped if t > broker_last}
+        self.stats = RollingStats(self.stats_window)
+        self.stats.extend(self.bars)
+        if self._forming is not None and self._forming['time'] <= self.bars['time'][-1]:
+            self._forming = None
+
+    def _push(self):
+        if self._partial:
+            self._skipped.add(int(self._forming['time']))
+        elif not len(self.bars) or self._forming['time'] > self.bars['time'][-1]:
+            self.bars = np.concatenate([self.bars[1 - self.history:], self._forming[None]])
+            self.stats.update(self._forming)
+        self._forming = None
+        self._partial = False
+
+    def update(self, m1_rates):
+        if m1_rates is None or len(m1_rates) < 2:
+            return
+        closed = m1_rates[:-1]
+        period = self.period
+        done = int(self.bars['time'][-1]) if len(self.bars) else None
+        start = int(np.searchsorted(closed['time'], self._last_m1, side='right'))
+        # بافر به ردیف‌های قبلاً دیده‌شده نمی‌رسد (بارگذاری اول یا دوباره): ممکن است ردیف‌هایی جا افتاده باشند
+        gap = start == 0 and (self._last_m1 == 0 or int(closed[0]['time']) > self._last_m1 + 60)
+        first_row = int(closed[0]['time'])
+        if gap and self._forming is not None:
+            self._partial = True
+        for row in closed[start:]:
+            t = int(row['time'])
+            bucket = t - t % period
+            if self._forming is not None and bucket != self._forming['time']:
+                self._push()
+                done = int(self.bars['time'][-1]) if len(self.bars) else None
+            if self._forming is None:
+                if done is not None and bucket <= done:
+                    self._last_m1 = t
+                    continue
+                self._forming = np.zeros((), RATES_DTYPE)
+                for name in RATES_DTYPE.names:
+                    self._forming[name] = row[name]
+                self._forming['time'] = bucket
+                # کندلی که قبل از اولین ردیف موجود بعد از گسستگی شروع شده ناقص است
+                self._partial = gap and first_row > bucket
+            else:
+                f = self._forming
+                f['high'] = max(f['high'], row['high'])
+                f['low'] = min(f['low'], row['low'])
+                f['close'] = row['close']
+                f['tick_volume'] += row['tick_volume']
+                f['real_volume'] += row['real_volume']
+                f['spread'] = row['spread']
+            self._last_m1 = t
+
+        self.last_seen = int(m1_rates[-1]['time'])
+        if self._forming is not None and self._forming['time'] + period <= self.last_seen:
+            self._push()
+
+    def completed(self, count):
+        """
+        Last `count` completed bars (oldest first), or None if fewer are known,
+        the bar just before the forming one is missing (stale output) or a
+        partial bucket was skipped inside the range.
+        """
+        if len(self.bars) < count:
+            return None
+        expected = self.last_seen - self.last_seen % self.period - self.period
+        if int(self.bars['time'][-1]) != expected:
+            return None
+        first = int(self.bars['time'][-count])
+        if any(t >= first for t in self._skipped):
+            return None
+        return self.bars[-count:]
+
+
+def get_aggregator(symbol, period, create=False, history=64):
+    key = (symbol, period)
+    agg = _aggregators.get(key)
+    if agg is None and create:
+        agg = _aggregators[key] = BarAggregator(period, history)
+    return agg
+
+
+def completed_bars(symbol, period, count):
+    """Last `count` completed bars of `period` built from M1, or None if not available."""
+    agg = _aggregators.get((symbol, period))
+    return agg.completed(count) if agg is not None else None
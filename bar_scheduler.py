@@ -0,0 +1,138 @@
+import time
+from collections import deque
+
+import MetaTrader5 as mt5
+
+from mt5_connector import TIMEFRAME_SECONDS
+
+
+class BarScheduler:
+    """
+    Wakes the main loop at bar boundaries instead of a fixed 0.5s poll.
+
+    Broker server time is tracked from tick timestamps (server clock =
+    local clock + offset, the offset being the largest tick lead seen over
+    the last few polls). Between boundaries only symbol_info_tick is polled,
+    every `poll_interval` seconds, so the loop can still manage positions.
+    Around a boundary the tick is polled every `tick_interval` seconds until
+    the first tick of the new bar arrives (then + `grace`), i.e. the moment
+    MT5 has actually opened the bar; after `boundary_timeout` seconds
+    without such a tick the boundary is reported anyway but stays pending:
+    the first later tick of the new bar reports it again, unless bar_seen()
+    says a fetch already showed the bar.
+
+    wait() returns the timeframes whose bar just closed (e.g. [M1, M15] at
+    :15), or an empty list for a plain housekeeping wake.
+    """
+
+    def __init__(self, symbol, timeframes=(mt5.TIMEFRAME_M1, mt5.TIMEFRAME_M15), poll_interval=0.5,
+                 tick_interval=0.02, grace=0.05, boundary_timeout=2.0, offset_window=120):
+        self.symbol = symbol
+        self.timeframes = [tf for tf in timeframes if tf in TIMEFRAME_SECONDS]
+        self.periods = {tf: TIMEFRAME_SECONDS[tf] for tf in self.timeframes}
+        self.base = min(self.periods.values())
+        self.poll_interval = poll_interval
+        self.tick_interval = tick_interval
+        self.grace = grace
+        self.boundary_timeout = boundary_timeout
+        self._leads = deque(maxlen=offset_window)
+        self.offset = None
+        self.last_tick_time = None
+        self.last_tick = None
+        self.next_boundary = None
+        self.pending_boundary = None  # مرزی که بدون تیک کندل جدید گزارش شد
+        self._pending_closed = set()
+        self.tick_calls = 0
+
+    # ---------- Server clock ----------
+    def poll_tick(self):
+        """symbol_info_tick + server clock update; returns tick time (server epoch seconds) or None."""
+        tick = mt5.symbol_info_tick(self.symbol)
+        self.tick_calls += 1
+        if not tick:
+            self.last_tick = None  # تیک قدیمی به‌عنوان قیمت فعلی استفاده نشود
+            return None
+        t = tick.time_msc / 1000.0 if getattr(tick, 'time_msc', 0) else float(tick.time)
+        # تیک همیشه کمی قدیمی‌تر از اکنون است؛ بیشترین اختلاف اخیر بهترین تخمین ساعت سرور است
+        self._leads.append(t - time.time())
+        self.offset = max(self._leads)
+        self.last_tick_time = t
+        self.last_tick = tick
+        return t
+
+    def server_time(self):
+        return time.time() + (self.offset or 0.0)
+
+    def _boundary_after(self, server_t):
+        return (int(server_t) // self.base + 1) * self.base
+
+    def _closed(self, boundary):
+        return [tf for tf in self.timeframes if boundary % self.periods[tf] == 0]
+
+    def bar_seen(self):
+        """A fetch showed the new bar: the pending boundary needs no second report."""
+        self.pending_boundary = None
+        self._pending_closed = set()
+
+    def _report_pending(self):
+        closed = self._pending_closed
+        self.bar_seen()
+        return [tf for tf in self.timeframes if tf in closed]
+
+    # ---------- Waiting ----------
+    def wait(self, poll_interval=None):
+        """poll_interval overrides the housekeeping interval for this call (e.g. tick touch detection)."""
+        poll_interval = poll_interval or self.poll_interval
+        if self.offset is None and self.poll_tick() is None:
+            time.sleep(poll_interval)
+            return []
+        if self.next_boundary is None:
+            self.next_boundary = self._boundary_after(self.server_time())
+
+        boundary = self.next_boundary
+        server_now = self.server_time()
+        if server_now >= boundary + self.base:
+            # چند مرز از دست رفته (پردازش طولانی)؛ همه تایم‌فریم‌های بسته‌شده گزارش می‌شوند
+            last = int(server_now) // self.base * self.base
+            closed = set()
+            for b in range(boundary, last + 1, self.base):
+                closed.update(self._closed(b))
+            self.next_boundary = last + self.base
+            return [tf for tf in self.timeframes if tf in closed]
+
+        wake_at = boundary - (self.offset or 0.0)  # زمان محلی مرز بعدی
+        now = time.time()
+        if now + poll_interval < wake_at:
+            time.sleep(poll_interval)
+            tick_t = self.poll_tick()
+            if tick_t is None:
+                return []
+            if tick_t < boundary:
+                if self.pending_boundary is None or tick_t < self.pending_boundary:
+                    return []
+                # اولین تیک کندلی که مرزش بدون تیک گذشته بود (بازار آرام، rollover)
+                if self.grace:
+                    time.sleep(self.grace)
+                return self._report_pending()
+            # تیک کندل جدید زودتر از تخمین ساعت رسید
+            timed_out = False
+        else:
+            if now < wake_at:
+                time.sleep(wake_at - now)
+            deadline = time.time() + self.boundary_timeout
+            while True:
+                tick_t = self.poll_tick()
+                timed_out = tick_t is None or tick_t < boundary
+                if not timed_out or time.time() >= deadline:
+                    break
+                time.sleep(self.tick_interval)
+
+        if self.grace:
+            time.sleep(self.grace)
+        self.next_boundary = self._boundary_after(max(boundary, self.server_time()))
+        self._pending_closed.update(self._closed(boundary))
+        if timed_out:
+            # کندل جدید شاید هنوز باز نشده؛ مرز تا رسیدن تیک یا bar_seen در انتظار می‌ماند
+            self.pending_boundary = boundary
+            return [tf for tf in self.timeframes if tf in self._pending_closed]
+        return self._report_pending()
@@ -0,0 +1,156 @@
+from pathlib import Path
+
+import numpy as np
+
+from market_window import MarketWindow
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_DIR = ROOT / "trading-analytics-logger" / "data" / "bars"
+
+# رکورد ثابت 60 بایتی، همان layout آرایه copy_rates_* در MT5
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+# هر چند رکورد یک ورودی در ایندکس زمانی کوچک (در حافظه)
+INDEX_STRIDE = 4096
+
+# مقادیر ثابت‌های mt5.TIMEFRAME_*؛ بدون import MetaTrader5 تا بک‌تست روی هر سیستمی اجرا شود
+TIMEFRAME_NAMES = {1: 'M1', 5: 'M5', 15: 'M15', 30: 'M30', 16385: 'H1', 16388: 'H4', 16408: 'D1'}
+
+
+class BarSeries:
+    """
+    One append-only file of closed bars (<symbol>_<timeframe>.bars) with
+    fixed-width RATES_DTYPE records in time order. Reads are zero-copy
+    slices of a read-only memmap; time lookups bisect a sparse in-memory
+    index (every INDEX_STRIDE-th time) and then one block of the file.
+
+    A trailing partial record (process killed mid-append) is cut off the
+    first time the file is used, so later appends stay record-aligned.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._map = None
+        self._sparse = None
+        self._last_time = None
+        self._checked = False
+
+    def __len__(self):
+        if not self._checked:
+            self._repair()
+        return self.path.stat().st_size // RATES_DTYPE.itemsize if self.path.exists() else 0
+
+    def _repair(self):
+        self._checked = True
+        if not self.path.exists():
+            return
+        size = self.path.stat().st_size
+        torn = size % RATES_DTYPE.itemsize
+        if torn:
+            print(f"⚠️ Bar store {self.path.name}: dropping {torn} bytes of a partial record")
+            with open(self.path, 'r+b') as fh:
+                fh.truncate(size - torn)
+
+    def discard(self):
+        """Move the file aside (<name>.old) and continue as an empty series."""
+        self._map = None
+        self._sparse = None
+        self._last_time = None
+        if self.path.exists():
+            self.path.replace(self.path.with_name(self.path.name + '.old'))
+
+    def bars(self):
+        """Whole series as a read-only memmap (empty array when nothing is stored)."""
+        n = len(self)
+        if n == 0:
+            return np.empty(0, RATES_DTYPE)
+        if self._map is None or len(self._map) != n:
+            self._map = np.memmap(self.path, dtype=RATES_DTYPE, mode='r', shape=(n,))
+            self._sparse = np.array(self._map['time'][::INDEX_STRIDE])
+        return self._map
+
+    @property
+    def last_time(self):
+        if self._last_time is None:
+            bars = self.bars()
+            self._last_time = int(bars['time'][-1]) if len(bars) else 0
+        return self._last_time
+
+    def searchsorted(self, t, side='left'):
+        """Position of epoch `t` in the series (same semantics as np.searchsorted)."""
+        bars = self.bars()
+        if len(bars) == 0:
+            return 0
+        block = max(int(np.searchsorted(self._sparse, t, side=side)) - 1, 0)
+        lo = block * INDEX_STRIDE
+        hi = min(lo + INDEX_STRIDE + 1, len(bars))
+        return lo + int(np.searchsorted(bars['time'][lo:hi], t, side=side))
+
+    def read(self, start=None, end=None):
+        """Zero-copy slice of bars with start <= time < end (epoch seconds, None = open)."""
+        bars = self.bars()
+        lo = 0 if start is None else self.searchsorted(start)
+        hi = len(bars) if end is None else self.searchsorted(end)
+        return bars[lo:hi]
+
+    def tail(self, count):
+        bars = self.bars()
+        return bars[max(len(bars) - count, 0):]
+
+    def append(self, rates):
+        """Append closed bars newer than the last stored one; returns how many were written."""
+        if rates is None or len(rates) == 0:
+            return 0
+        times = rates['time']
+        if int(times[-1]) <= self.last_time:
+            return 0
+        new = rates[int(np.searchsorted(times, self.last_time, side='right')):]
+        if new.dtype != RATES_DTYPE:
+            new = new.astype(RATES_DTYPE)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'ab') as fh:
+            fh.write(np.ascontiguousarray(new).tobytes())
+        self._last_time = int(new['time'][-1])
+        return len(new)
+
+
+class BarStore:
+    """
+    On-disk bar history, one BarSeries per symbol/timeframe under `root`.
+    The live MT5Connector appends closed bars as it polls; backtests,
+    analytics and warm start read the same files:
+
+        store = BarStore()
+        rates = store.read('EURUSD', mt5.TIMEFRAME_M1, start=t0)  # memmap slice
+        window = store.window('EURUSD', mt5.TIMEFRAME_M1)          # MarketWindow
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root else DEFAULT_DIR
+        self._series = {}
+
+    def series(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        s = self._series.get(key)
+        if s is None:
+            name = TIMEFRAME_NAMES.get(timeframe, str(timeframe))
+            s = self._series[key] = BarSeries(self.root / f"{symbol}_{name}.bars")
+        return s
+
+    def append(self, symbol, timeframe, rates):
+        return self.series(symbol, timeframe).append(rates)
+
+    def read(self, symbol, timeframe, start=None, end=None):
+        return self.series(symbol, timeframe).read(start, end)
+
+    def tail(self, symbol, timeframe, count):
+        return self.series(symbol, timeframe).tail(count)
+
+    def last_time(self, symbol, timeframe):
+        return self.series(symbol, timeframe).last_time
+
+    def window(self, symbol, timeframe, start=None, end=None, tz=None):
+        return MarketWindow(self.read(symbol, timeframe, start, end), tz)
@@ -0,0 +1,13 @@
+"""
+تنظیمات مشترک تست‌ها: در نبود پکیج MetaTrader5 (لینوکس، CI) جایگزین آفلاین
+mt5_sim به مسیر import اضافه می‌شود تا تست‌ها بدون ترمینال اجرا شوند:
+    python -m pytest
+"""
+
+import os
+import sys
+
+try:
+    import MetaTrader5  # noqa: F401
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mt5_sim'))
@@ -0,0 +1,128 @@
+import threading
+
+import MetaTrader5 as mt5
+
+_MISSING = object()
+
+
+class CycleSnapshot:
+    """
+    Tick, open positions, account and terminal state of one main-loop cycle.
+
+    Between begin() calls each item is fetched from the terminal at most
+    once, on first use, so every helper of the cycle (trading checks,
+    conflict checks, position logging, position management) sees the same
+    state. Positions are indexed by ticket and by type, so "any open BUY?"
+    is a dict lookup. refresh() re-reads an item on purpose, e.g. the tick
+    right before order_send; invalidate() drops an item that an action has
+    made stale (positions after an order) so its next use fetches it again.
+
+    Before the first begin() nothing is kept and every access reads the
+    terminal, so callers outside the loop always get live data.
+
+    Safe to share with another thread: lookups and stores happen under a
+    lock, and a value whose fetch overlapped an invalidate() of the same
+    item (or a new begin()) is returned to its caller but not kept.
+    """
+
+    ITEMS = ('tick', 'positions', 'account', 'terminal')
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.active = False
+        self.fetches = 0
+        self._lock = threading.Lock()
+        self._values = {}  # name -> value; 'positions' -> (positions, by_ticket, by_type)
+        self._generations = dict.fromkeys(self.ITEMS, 0)
+
+    # ---------- Cycle ----------
+    def begin(self, tick=None):
+        """Start a new cycle; `tick` is a tick already read this cycle (e.g. BarScheduler.last_tick)."""
+        with self._lock:
+            self.active = True
+            self._values.clear()
+            for name in self.ITEMS:
+                self._generations[name] += 1
+            if tick is not None:
+                self._values['tick'] = tick
+
+    def invalidate(self, *names):
+        with self._lock:
+            for name in names or self.ITEMS:
+                self._values.pop(name, None)
+                self._generations[name] = self._generations.get(name, 0) + 1
+
+    def refresh(self, name):
+        """Re-read one item from the terminal now and return it."""
+        self.invalidate(name)
+        return self._get(name)
+
+    def _fetch(self, name):
+        self.fetches += 1
+        if name == 'tick':
+            return mt5.symbol_info_tick(self.symbol)
+        if name == 'positions':
+            return mt5.positions_get(symbol=self.symbol)
+        if name == 'account':
+            return mt5.account_info()
+        if name == 'terminal':
+            return mt5.terminal_info()
+        raise KeyError(name)
+
+    def _get(self, name):
+        with self._lock:
+            value = self._values.get(name, _MISSING)
+            generation = self._generations.get(name, 0)
+        if value is not _MISSING:
+            return value
+        value = self._fetch(name)
+        if name == 'positions':
+            value = self._index(value)
+        with self._lock:
+            # یک invalidate در حین خواندن یعنی این مقدار شاید قدیمی است: نگه داشته نمی‌شود
+            if self.active and self._generations.get(name, 0) == generation:
+                value = self._values.setdefault(name, value)
+        return value
+
+    @staticmethod
+    def _index(positions):
+        by_ticket = {}
+        by_type = {}
+        for pos in positions or ():
+            by_ticket[pos.ticket] = pos
+            by_type.setdefault(pos.type, []).append(pos)
+        return positions, by_ticket, by_type
+
+    # ---------- State ----------
+    @property
+    def tick(self):
+        return self._get('tick')
+
+    @property
+    def positions(self):
+        """Same as mt5.positions_get(symbol=...): a tuple, or None on error."""
+        return self._get('positions')[0]
+
+    @property
+    def account(self):
+        return self._get('account')
+
+    @property
+    def terminal(self):
+        return self._get('terminal')
+
+    # ---------- Position index ----------
+    def position(self, ticket):
+        return self._get('positions')[1].get(ticket)
+
+    def positions_of(self, position_type):
+        """Open positions of one mt5.POSITION_TYPE_*."""
+        return self._get('positions')[2].get(position_type, [])
+
+    def has_positions(self):
+        return bool(self._get('positions')[1])
+
+    def has_conflicting(self, intended_direction):
+        """Any open position against intended_direction ('buy' or 'sell')."""
+        opposite = mt5.POSITION_TYPE_SELL if intended_direction == 'buy' else mt5.POSITION_TYPE_BUY
+        return bool(self.positions_of(opposite))
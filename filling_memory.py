@@ -0,0 +1,53 @@
+import json
+import os
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_PATH = ROOT / "trading-analytics-logger" / "data" / "filling_modes.json"
+
+AUTO = "auto"  # سفارش بدون type_filling
+
+
+class FillingModeMemory:
+    """
+    The type_filling that last got an order accepted, per broker server and
+    symbol, kept in a small JSON file so a restart does not have to rediscover
+    it by trial orders. Values are mt5.ORDER_FILLING_* ints or AUTO.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else DEFAULT_PATH
+        self._modes = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"⚠️ Filling mode memory unreadable ({self.path}): {e}")
+            return {}
+
+    @staticmethod
+    def _key(broker, symbol):
+        return f"{broker or 'default'}|{symbol}"
+
+    def get(self, broker, symbol):
+        return self._modes.get(self._key(broker, symbol))
+
+    def remember(self, broker, symbol, mode):
+        key = self._key(broker, symbol)
+        if self._modes.get(key) == mode:
+            return
+        self._modes[key] = mode
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._modes, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"⚠️ Filling mode memory save failed: {e}")
+
@@ -0,0 +1,157 @@
+from collections import deque
+
+import numpy as np
+
+
+class RollingStats:
+    """
+    O(1) rolling statistics over the last `window` closed bars of one
+    timeframe: mean range (high-low), mean body ratio (|close-open|/range)
+    and an ATR (simple mean of true range).
+
+    One extra bar is kept so the mean of the `window` bars *before* the
+    latest one (what the M15 filter compares the latest candle against) is
+    also O(1). The running sums are re-added exactly every `window` updates
+    so float drift cannot build up.
+    """
+
+    FIELDS = ('range', 'body_ratio', 'tr')
+
+    def __init__(self, window=20):
+        self.window = window
+        self._rows = deque(maxlen=window + 1)  # (range, body_ratio, tr)
+        self._sums = [0.0, 0.0, 0.0]
+        self._prev_close = None
+        self._updates = 0
+        self.last_time = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def update(self, bar):
+        """Add one closed bar (dict or rates row with open/high/low/close[/time])."""
+        o, h, l, c = float(bar['open']), float(bar['high']), float(bar['low']), float(bar['close'])
+        rng = h - l
+        body_ratio = abs(c - o) / rng if rng > 0 else 0.0
+        pc = self._prev_close
+        tr = rng if pc is None else max(rng, abs(h - pc), abs(l - pc))
+        row = (rng, body_ratio, tr)
+        if len(self._rows) == self._rows.maxlen:
+            old = self._rows[0]
+            for k in range(3):
+                self._sums[k] -= old[k]
+        self._rows.append(row)
+        for k in range(3):
+            self._sums[k] += row[k]
+        self._prev_close = c
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._sums = [sum(r[k] for r in self._rows) for k in range(3)]
+        try:
+            self.last_time = int(bar['time'])
+        except (KeyError, ValueError, TypeError):
+            pass
+
+    def extend(self, bars):
+        for bar in bars:
+            self.update(bar)
+
+    def _mean(self, k, exclude_last):
+        n = len(self._rows)
+        if n == 0:
+            return 0.0
+        total = self._sums[k]
+        if exclude_last:
+            # میانگین `window` کندل قبل از آخرین کندل
+            if n == 1:
+                return 0.0
+            return (total - self._rows[-1][k]) / (n - 1)
+        if n > self.window:
+            return (total - self._rows[0][k]) / self.window
+        return total / n
+
+    def avg_range(self, exclude_last=False):
+        return self._mean(0, exclude_last)
+
+    def avg_body_ratio(self, exclude_last=False):
+        return self._mean(1, exclude_last)
+
+    def atr(self, exclude_last=False):
+        return self._mean(2, exclude_last)
+
+
+# ویژگی‌های هر کندل، یک بار برای هر کندل بسته‌شده محاسبه و بین legs/swing/فاز/فیلتر M15 مشترک
+FEATURE_DTYPE = np.dtype([
+    ('direction', 'i1'),    # +1 صعودی (close > open)، -1 نزولی، 0 دوجی
+    ('bearish', '?'),       # open > close (همان status == 'bearish')
+    ('range', 'f8'),        # high - low
+    ('body', 'f8'),         # |close - open|
+    ('body_ratio', 'f8'),   # body / range (0 اگر range صفر)
+    ('wick_ratio', 'f8'),   # (range - body) / range
+    ('close_pos', 'f8'),    # (close - low) / range
+])
+
+
+def candle_features(rates, out=None):
+    """
+    FEATURE_DTYPE row per bar of a rates array (or anything with
+    open/high/low/close columns). With `out`, the rows are written there.
+    """
+    o = np.asarray(rates['open'], dtype=float)
+    h = np.asarray(rates['high'], dtype=float)
+    l = np.asarray(rates['low'], dtype=float)
+    c = np.asarray(rates['close'], dtype=float)
+    if out is None:
+        out = np.empty(len(o), FEATURE_DTYPE)
+    rng = h - l
+    body = np.abs(c - o)
+    valid = rng != 0
+    out['direction'] = np.sign(c - o)
+    out['bearish'] = o > c
+    out['range'] = rng
+    out['body'] = body
+    out['body_ratio'] = np.divide(body, rng, out=np.zeros_like(rng), where=valid)
+    out['wick_ratio'] = np.divide(rng - body, rng, out=np.zeros_like(rng), where=valid)
+    out['close_pos'] = np.divide(c - l, rng, out=np.zeros_like(rng), where=valid)
+    return out
+
+
+def bar_features(rates):
+    """Per-bar range, body ratio and true range arrays for a rates array."""
+    feats = candle_features(rates)
+    h = np.asarray(rates['high'], dtype=float)
+    l = np.asarray(rates['low'], dtype=float)
+    c = np.asarray(rates['close'], dtype=float)
+    rng = feats['range']
+    body_ratio = feats['body_ratio']
+    tr = rng.copy()
+    if len(c) > 1:
+        pc = c[:-1]
+        tr[1:] = np.maximum(rng[1:], np.maximum(np.abs(h[1:] - pc), np.abs(l[1:] - pc)))
+    return {'range': rng, 'body_ratio': body_ratio, 'tr': tr}
+
+
+def rolling_mean(values, window=20, exclude_current=False):
+    """
+    Trailing mean via cumulative sums. out[i] is the mean of the last
+    `window` values up to and including i (or strictly before i with
+    exclude_current, as calculate_avg_range does); shorter at the start,
+    0 where nothing precedes.
+    """
+    values = np.asarray(values, dtype=float)
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(len(values)) + (0 if exclude_current else 1)
+    start = np.maximum(end - window, 0)
+    count = end - start
+    total = csum[end] - csum[start]
+    return np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+
+
+def rolling_stats(rates, window=20, exclude_current=False):
+    """Bulk mode of RollingStats over a whole history: dict of per-bar arrays."""
+    feats = bar_features(rates)
+    return {
+        'avg_range': rolling_mean(feats['range'], window, exclude_current),
+        'avg_body_ratio': rolling_mean(feats['body_ratio'], window, exclude_current),
+        'atr': rolling_mean(feats['tr'], window, exclude_current),
+    }
@@ -22,6 +22,8 @@ import MetaTrader5 as mt5
 from datetime import datetime, timedelta
 from typing import Optional, Tuple, Dict
 from save_file import log as original_log
+from bar_aggregator import get_aggregator
+from indicators import candle_features
 import inspect
 import os
 
@@ -80,15 +82,27 @@ def calculate_avg_range(rates, current_idx: int, window: int = 20) -> float:
         میانگین رنج
     """
     start_idx = max(0, current_idx - window)
-    total_range = 0
-    count = 0
-    
-    for i in range(start_idx, current_idx):
-        candle_range = rates[i]['high'] - rates[i]['low']
-        total_range += candle_range
-        count += 1
-    
-    return total_range / count if count > 0 else 0
+    if current_idx <= start_idx:
+        return 0
+    prev = rates[start_idx:current_idx]
+    return float((prev['high'] - prev['low']).mean())
+
+
+def _candle_ratios(candle: Dict) -> Tuple[float, float, float, float, float]:
+    """
+    (range, body, body_ratio, wick_ratio, close_pos) یک کندل؛ از ویژگی‌های
+    پیش‌محاسبه‌شده (کلید 'features' از get_last_completed_m15_candle) در صورت وجود
+    """
+    feat = candle.get('features')
+    if feat is not None:
+        return (float(feat['range']), float(feat['body']), float(feat['body_ratio']),
+                float(feat['wick_ratio']), float(feat['close_pos']))
+    candle_range = candle['high'] - candle['low']
+    body = abs(candle['close'] - candle['open'])
+    if candle_range == 0:
+        return candle_range, body, 0.0, 0.0, 0.0
+    return (candle_range, body, body / candle_range, (candle_range - body) / candle_range,
+            (candle['close'] - candle['low']) / candle_range)
 
 
 def is_candle_meaningful(candle: Dict, avg_range: float) -> Tuple[bool, str]:
@@ -102,22 +116,16 @@ def is_candle_meaningful(candle: Dict, avg_range: float) -> Tuple[bool, str]:
     Returns:
         (is_meaningful, reason)
     """
-    candle_range = candle['high'] - candle['low']
+    candle_range, body, body_ratio, wick_ratio, _ = _candle_ratios(candle)
     
     if candle_range == 0:
         return False, "رنج کندل صفر است"
     
-    body = abs(candle['close'] - candle['open'])
-    body_ratio = body / candle_range
-    
     # شرط مستقیم: بدنه خیلی ضعیف (< 20%)
     if body_ratio < 0.20:
         return False, f"بدنه خیلی ضعیف: {body_ratio:.0%} < 20%"
     
-    # ویک کل = رنج - بدنه
-    wick_total = candle_range - body
-    wick_ratio = wick_total / candle_range
-    
+    # ویک کل = رنج - بدنه (wick_ratio = ویک کل / رنج)
     # شرط ترکیبی: بدنه ضعیف + فیتیله بلند
     if body_ratio < 0.30 and wick_ratio > 0.60:
         return False, f"کندل بی‌معنی: body={body_ratio:.0%}, wick={wick_ratio:.0%}"
@@ -137,20 +145,16 @@ def is_reversed_valid(candle: Dict, avg_range: float) -> Tuple[bool, str]:
     Returns:
         (is_valid, reason)
     """
-    candle_range = candle['high'] - candle['low']
+    candle_range, body, body_ratio, _, close_position = _candle_ratios(candle)
     
     if candle_range == 0:
         return False, "رنج صفر"
     
-    body = abs(candle['close'] - candle['open'])
-    body_ratio = body / candle_range
-    
     # شرط 1: بدنه حداقل 55%
     if body_ratio < 0.55:
         return False, f"بدنه ضعیف: {body_ratio:.0%} < 55%"
     
-    # شرط 2: close در 30% انتهایی
-    close_position = (candle['close'] - candle['low']) / candle_range
+    # شرط 2: close در 30% انتهایی (close_position از ویژگی‌های کندل)
     
     # اگر صعودی: close باید در 70% بالا باشد (30% انتهایی بالا)
     # اگر نزولی: close باید در 30% پایین باشد (30% انتهایی پایین)
@@ -177,15 +181,29 @@ def get_last_completed_m15_candle(symbol: str) -> Optional[Dict]:
         یا None در صورت خطا
     """
     try:
-        # دریافت 22 کندل (20 برای میانگین + 1 تکمیل‌شده + 1 در حال تشکیل)
-        rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M15, 0, 22)
-        
-        if rates is None or len(rates) < 22:
-            log(f"❌ Could not get M15 candles for {symbol}", color='red')
-            return None
-        
-        # کندل تکمیل‌شده - ایندکس -2 (آخرین کندل کامل قبل از کندل در حال تشکیل)
-        candle = rates[-2]
+        # کندل‌های M15 ساخته‌شده از جریان M1 در حافظه (بدون درخواست به بروکر)
+        agg = get_aggregator(symbol, 900)
+        rates = agg.completed(21) if agg is not None else None
+        avg_range = None
+        if rates is not None:
+            last_idx = len(rates) - 1
+            # میانگین رنج 20 کندل قبلی از RollingStats (O(1))
+            if agg.stats.last_time == int(rates[last_idx]['time']):
+                avg_range = agg.stats.avg_range(exclude_last=True)
+        else:
+            # دریافت 22 کندل (20 برای میانگین + 1 تکمیل‌شده + 1 در حال تشکیل)
+            rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M15, 0, 22)
+
+            if rates is None or len(rates) < 22:
+                log(f"❌ Could not get M15 candles for {symbol}", color='red')
+                return None
+
+            # کندل تکمیل‌شده - ایندکس -2 (آخرین کندل کامل قبل از کندل در حال تشکیل)
+            last_idx = len(rates) - 2
+
+        candle = rates[last_idx]
+        # ویژگی‌های کندل یک بار محاسبه و در فیلتر صفر / Reversed استفاده می‌شوند
+        features = candle_features(rates[last_idx:last_idx + 1])[0]
         
         open_price = float(candle['open'])
         high_price = float(candle['high'])
@@ -211,7 +229,8 @@ def get_last_completed_m15_candle(symbol: str) -> Optional[Dict]:
             body_ratio = 0
         
         # محاسبه میانگین رنج 20 کندل قبلی
-        avg_range = calculate_avg_range(rates, len(rates) - 2, window=20)
+        if avg_range is None:
+            avg_range = calculate_avg_range(rates, last_idx, window=20)
         
         return {
             'time': candle_time,
@@ -223,7 +242,8 @@ def get_last_completed_m15_candle(symbol: str) -> Optional[Dict]:
             'body_ratio': body_ratio,
             'range': candle_range,
             'body_size': body_size,
-            'avg_range': avg_range
+            'avg_range': avg_range,
+            'features': features,
         }
         
     except Exception as e:
@@ -231,6 +251,59 @@ def get_last_completed_m15_candle(symbol: str) -> Optional[Dict]:
         return None
 
 
+class M15FilterCache:
+    """
+    Last completed M15 candle per symbol with its avg_range and both
+    classifications (is_candle_meaningful, is_reversed_valid), which do not
+    depend on the signal direction. An entry is keyed by the open time of
+    the broker's last completed M15 candle, so it refreshes only when a new
+    M15 candle completes, and buy and sell signals share it. The time comes
+    from the in-memory M15 aggregator when its output is current, else from
+    a one-bar copy_rates_from_pos request (never from the local clock).
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    @staticmethod
+    def _key(symbol: str):
+        agg = get_aggregator(symbol, 900)
+        if agg is not None and agg.completed(1) is not None:
+            return int(agg.bars['time'][-1])
+        # کندل شماره 1 = آخرین کندل M15 تکمیل‌شده بروکر
+        rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M15, 1, 1)
+        if rates is None or len(rates) == 0:
+            return None
+        return int(rates[-1]['time'])
+
+    def get(self, symbol: str) -> Optional[Tuple[Dict, Tuple[bool, str], Tuple[bool, str]]]:
+        """(m15_info, meaningful_result, reversed_result) or None if M15 data is unavailable."""
+        key = self._key(symbol)
+        entry = self._entries.get(symbol)
+        if key is not None and entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:]
+        self.misses += 1
+        m15 = get_last_completed_m15_candle(symbol)
+        if m15 is None:
+            return None
+        avg_range = m15.get('avg_range', 0)
+        entry = (key, m15, is_candle_meaningful(m15, avg_range), is_reversed_valid(m15, avg_range))
+        self._entries[symbol] = entry
+        return entry[1:]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+m15_cache = M15FilterCache()
+
+
 def apply_m15_filter(
     signal_direction: str,  # 'buy' یا 'sell'
     entry_price: float,
@@ -258,10 +331,10 @@ def apply_m15_filter(
         - m15_info: اطلاعات کندل M15
     """
     
-    # دریافت کندل M15
-    m15 = get_last_completed_m15_candle(symbol)
+    # دریافت کندل M15 و دسته‌بندی آن (از کش، فقط با بسته شدن کندل M15 جدید دوباره محاسبه می‌شود)
+    cached = m15_cache.get(symbol)
     
-    if m15 is None:
+    if cached is None:
         log(f"⚠️ Could not get M15 candle - executing original signal", color='yellow')
         # در صورت عدم دسترسی به M15، سیگنال اصلی اجرا شود
         stop_distance = abs(entry_price - original_sl)
@@ -272,13 +345,12 @@ def apply_m15_filter(
         
         return ('EXECUTE_ALIGNED', 'M15 data unavailable', original_sl, final_tp, signal_direction, {})
     
+    m15, (is_meaningful, meaning_reason), (reversed_ok, reversed_reason) = cached
     avg_range = m15.get('avg_range', 0)
     
     log(f"📊 M15 Candle: time={m15['time']} dir={m15['direction']} body={m15['body_ratio']:.1f}% range={m15['range']:.5f} avg={avg_range:.5f}", color='cyan')
     
     # ===== فیلتر صفر: بررسی معنادار بودن کندل =====
-    is_meaningful, meaning_reason = is_candle_meaningful(m15, avg_range)
-    
     if not is_meaningful:
         log(f"🚫 M15 SKIP (فیلتر صفر): {meaning_reason}", color='yellow')
         return (
@@ -314,9 +386,7 @@ def apply_m15_filter(
         )
     
     else:
-        # مخالف روند - بررسی شرایط سخت‌گیرانه Reversed
-        reversed_ok, reversed_reason = is_reversed_valid(m15, avg_range)
-        
+        # مخالف روند - بررسی شرایط سخت‌گیرانه Reversed (از کش)
         if reversed_ok:
             # ✅ Reversed معتبر - پوزیشن معکوس
             log(f"🔄 M15 REVERSED: {m15['direction']} - {reversed_reason}", color='blue')
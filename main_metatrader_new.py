@@ -1,16 +1,20 @@
 import MetaTrader5 as mt5
 from datetime import datetime
 from fibo_calculate import fibonacci_retracement
-import numpy as np
 import pandas as pd
-from time import sleep
+from time import sleep, monotonic
 from colorama import init, Fore
-from get_legs import get_legs
+from get_legs import get_legs, LegTracker
 from mt5_connector import MT5Connector
-from swing import get_swing_points
+from bar_scheduler import BarScheduler
+from touch_detector import TickTouchDetector
+from order_lane import OrderLane
+from swing import swing_cache
+from symbol_spec import symbol_specs
 from utils import BotState
 from save_file import log
 import inspect, os
+from functools import partial
 from metatrader5_config import MT5_CONFIG, TRADING_CONFIG, DYNAMIC_RISK_CONFIG
 from email_notifier import send_trade_email_async
 from analytics.hooks import log_signal, log_position_event
@@ -41,6 +45,17 @@ def main():
     f = 0
     position_open = False
     last_swing_type = None
+    # ردیابی افزایشی لگ‌ها به‌جای محاسبه مجدد کل پنجره در هر سیکل
+    leg_tracker = LegTracker() if TRADING_CONFIG.get('incremental_legs', False) else None
+    # زمان‌بندی روی مرز کندل‌ها: بین مرزها فقط symbol_info_tick، دریافت کندل‌ها فقط با بسته شدن کندل
+    scheduler = BarScheduler(mt5_conn.symbol) if TRADING_CONFIG.get('bar_aligned_scheduler', True) else None
+    bar_due = True
+    # تشخیص لمس فیبو 0.705 در سطح تیک (اختیاری)؛ 'close' فقط تأخیر را اندازه می‌گیرد
+    touch_detector = (TickTouchDetector(status_mode=TRADING_CONFIG.get('tick_touch_status', 'live'))
+                      if TRADING_CONFIG.get('tick_touch', False) else None)
+    snapshot = mt5_conn.snapshot
+    # همه فراخوانی‌های معاملاتی (باز کردن، تغییر SL/TP، بستن) روی یک thread جدا با صف
+    order_lane = OrderLane(mt5_conn, asynchronous=TRADING_CONFIG.get('order_lane', True))
 
     print(f"🚀 MT5 Trading Bot Started...")
     print(f"📊 Config: Symbol={MT5_CONFIG['symbol']}, Lot={MT5_CONFIG['lot_size']}, Win Ratio={win_ratio}")
@@ -88,8 +103,9 @@ def main():
 
     # اضافه کردن متغیر برای ذخیره آخرین داده
     last_data_time = None
-    wait_count = 0
-    max_wait_cycles = 120  # پس از 60 ثانیه (120 * 0.5) اجبار به پردازش
+    waiting_since = None  # monotonic() آخرین داده جدید
+    max_wait_seconds = 60  # پس از 60 ثانیه بدون داده جدید اجبار به پردازش، مستقل از طول سیکل (0.5 یا 0.1 ثانیه)
+    next_wait_log = 10
     # نگهداری وضعیت قبلی قابلیت معامله برای ریست در انتهای ساعات ترید
     last_can_trade_state = None
 
@@ -98,41 +114,32 @@ def main():
         nonlocal start_index
         state.reset()
         start_index = max(0, len(cache_data) - window_size)
-        log(f'Reset state -> new start_index={start_index} (slice len={len(cache_data.iloc[start_index:])})', color='magenta')
+        log(f'Reset state -> new start_index={start_index} (slice len={len(cache_data) - start_index})', color='magenta')
     
     # حالت‌های مدیریت پوزیشن
     position_states = {}  # ticket -> {'entry':..., 'risk':..., 'direction':..., 'done_stages':set(), 'base_tp_R':float, 'commission_locked':False}
 
     def _digits():
-        info = mt5.symbol_info(MT5_CONFIG['symbol'])
-        return info.digits if info else 5
+        spec = symbol_specs.get(MT5_CONFIG['symbol'])
+        return spec.digits if spec else 5
 
     def _round(p):
         return float(f"{p:.{_digits()}f}")
 
     def has_open_positions():
-        """بررسی وجود پوزیشن‌های باز"""
-        positions = mt5_conn.get_positions()
-        return positions is not None and len(positions) > 0
+        """بررسی وجود پوزیشن‌های باز (سفارش باز کردن در صف هم حساب می‌شود)"""
+        return snapshot.has_positions() or order_lane.pending('open') > 0
 
     def has_conflicting_positions(intended_direction):
         """بررسی وجود پوزیشن‌های مخالف با جهت مورد نظر
         intended_direction: 'buy' یا 'sell'
         """
-        positions = mt5_conn.get_positions()
-        if not positions:
-            return False
-        
-        for pos in positions:
-            if intended_direction == 'buy' and pos.type == mt5.POSITION_TYPE_SELL:
-                return True
-            elif intended_direction == 'sell' and pos.type == mt5.POSITION_TYPE_BUY:
-                return True
-        return False
+        opposite = 'sell' if intended_direction == 'buy' else 'buy'
+        return snapshot.has_conflicting(intended_direction) or order_lane.pending('open', opposite) > 0
 
     def log_open_positions():
         """نمایش جزئیات پوزیشن‌های باز"""
-        positions = mt5_conn.get_positions()
+        positions = snapshot.positions
         if not positions:
             return
         log(f"📊 Open positions count: {len(positions)}", color='cyan')
@@ -142,7 +149,7 @@ def main():
 
     def get_positions_summary():
         """دریافت خلاصه‌ای از پوزیشن‌های باز برای ایمیل"""
-        positions = mt5_conn.get_positions()
+        positions = snapshot.positions
         if not positions:
             return "No open positions"
         
@@ -187,13 +194,51 @@ def main():
         except Exception:
             pass
 
+    def report_order(trade_type):
+        """callback سفارش باز کردن در order lane: نتیجه بعد از پاسخ بروکر لاگ می‌شود"""
+        def report(result):
+            if result and getattr(result, 'retcode', None) == 10009:
+                log(f'✅ {trade_type.upper()} order executed successfully', color='green')
+                log(f'📊 Ticket={result.order} Price={result.price} Volume={result.volume}', color='cyan')
+            elif result:
+                log(f'❌ {trade_type.upper()} failed retcode={result.retcode} comment={result.comment}', color='red')
+            else:
+                log(f'❌ {trade_type.upper()} failed (no result object)', color='red')
+        return report
+
+    def on_stage_result(res, pos, st, sid, event_name, cur_price, new_sl_r, new_tp_r, profit_R, locked_R):
+        """نتیجه تغییر SL/TP یک مرحله (در order_lane.poll روی thread اصلی)"""
+        if not (res and getattr(res, 'retcode', None) == 10009):
+            st['done_stages'].discard(sid)  # در سیکل بعد دوباره امتحان شود
+            return
+        log(f'⚙️ Dynamic Risk Stage {sid} applied: ticket={pos.ticket} | Profit: {profit_R:.2f}R | SL: {new_sl_r} | TP: {new_tp_r}', color='cyan')
+        try:
+            log_position_event(
+                symbol=MT5_CONFIG['symbol'],
+                ticket=pos.ticket,
+                event=event_name or sid,
+                direction=st['direction'],
+                entry=st['entry'],
+                current_price=cur_price,
+                sl=new_sl_r,
+                tp=new_tp_r,
+                profit_R=profit_R,
+                stage=None,
+                risk_abs=st['risk'],
+                locked_R=locked_R,
+                volume=pos.volume,
+                note=f'stage {sid} trigger'
+            )
+        except Exception:
+            pass
+
     def manage_open_positions():
         if not DYNAMIC_RISK_CONFIG.get('enable'):
             return
-        positions = mt5_conn.get_positions()
+        positions = snapshot.positions
         if not positions:
             return
-        tick = mt5.symbol_info_tick(MT5_CONFIG['symbol'])
+        tick = snapshot.tick
         if not tick:
             return
         stages_cfg = DYNAMIC_RISK_CONFIG.get('stages', [])
@@ -213,7 +258,6 @@ def main():
             else:
                 price_profit = entry - cur_price
             profit_R = price_profit / risk if risk else 0.0
-            modified_any = False
 
             # محاسبه ارزش پولی 1R تقریبی (بدون اسپرد) برای تبدیل کامیشن به R:
             # risk_abs_price = risk (فاصله قیمتی) * volume * contract ارزش واقعی - ساده‌سازی: فقط نسبت بر اساس فاصله قیمتی.
@@ -257,35 +301,21 @@ def main():
                     if direction == 'sell' and new_sl_r < pos.sl:
                         apply = True
                     if apply:
-                        res = mt5_conn.modify_sl_tp(pos.ticket, new_sl=new_sl_r, new_tp=new_tp_r)
-                        if res and getattr(res, 'retcode', None) == 10009:
-                            st['done_stages'].add(sid)
-                            modified_any = True
-                            log(f'⚙️ Dynamic Risk Stage {sid} applied: ticket={pos.ticket} | Profit: {profit_R:.2f}R | SL: {new_sl_r} | TP: {new_tp_r}', color='cyan')
-                            try:
-                                log_position_event(
-                                    symbol=MT5_CONFIG['symbol'],
-                                    ticket=pos.ticket,
-                                    event=event_name or sid,
-                                    direction=direction,
-                                    entry=entry,
-                                    current_price=cur_price,
-                                    sl=new_sl_r,
-                                    tp=new_tp_r,
-                                    profit_R=profit_R,
-                                    stage=None,
-                                    risk_abs=risk,
-                                    locked_R=locked_R,
-                                    volume=pos.volume,
-                                    note=f'stage {sid} trigger'
-                                )
-                            except Exception:
-                                pass
-            if modified_any:
-                position_states[pos.ticket] = st
+                        # تا رسیدن پاسخ بروکر، همین مرحله دوباره ارسال نشود
+                        st['done_stages'].add(sid)
+                        order_lane.modify_sl_tp(
+                            pos.ticket, new_sl=new_sl_r, new_tp=new_tp_r,
+                            callback=partial(on_stage_result, pos=pos, st=st, sid=sid, event_name=event_name,
+                                             cur_price=cur_price, new_sl_r=new_sl_r, new_tp_r=new_tp_r,
+                                             profit_R=profit_R, locked_R=locked_R)
+                        )
 
     while True:
         try:
+            # نتایج سفارش‌های تمام‌شده (لاگ، مراحل SL/TP) روی همین thread اعمال می‌شوند
+            order_lane.poll()
+            # وضعیت ترمینال در این سیکل: هر کدام حداکثر یک بار خوانده می‌شود
+            snapshot.begin(scheduler.last_tick if scheduler is not None else None)
             # بررسی ساعات معاملاتی
             can_trade, trade_message = mt5_conn.can_trade()
             # اگر از حالت قابل معامله به غیرقابل معامله تغییر کرد => ریست کامل BotState
@@ -303,64 +333,100 @@ def main():
                 sleep(60)
                 continue
             
-            # دریافت داده از MT5
-            cache_data = mt5_conn.get_historical_data(count=window_size)
-            
-            if cache_data is None:
-                log("❌ Failed to get data from MT5", color='red')
-                sleep(5)
-                continue
-                
-            cache_data['status'] = np.where(cache_data['open'] > cache_data['close'], 'bearish', 'bullish')
-            
+            # دریافت داده از MT5 (با scheduler فقط روی مرز کندل یا اجبار به پردازش)
+            fetch_due = (scheduler is None or bar_due
+                         or (waiting_since is not None and monotonic() - waiting_since >= max_wait_seconds))
+            if fetch_due:
+                # پنجره بدون کپی روی بافر کندل‌ها؛ DataFrame فقط برای دیباگ (cache_data.to_frame())
+                cache_data = mt5_conn.get_market_window(count=window_size)
+
+                if cache_data is None:
+                    log("❌ Failed to get data from MT5", color='red')
+                    sleep(5)
+                    continue
+
+                current_time = cache_data.index[-1]
+                bar_due = False
+            else:
+                current_time = last_data_time
+
             # بررسی تغییر داده - مشابه main_saver_copy2.py
-            current_time = cache_data.index[-1]
             if last_data_time is None:
                 log(f"🔄 First run - processing data from {current_time}", color='cyan')
                 last_data_time = current_time
                 process_data = True
-                wait_count = 0
+                waiting_since, next_wait_log = monotonic(), 10
             elif current_time != last_data_time:
                 log(f"📊 New data received: {current_time} (previous: {last_data_time})", color='cyan')
                 last_data_time = current_time
                 process_data = True
-                wait_count = 0
+                waiting_since, next_wait_log = monotonic(), 10
+                if scheduler is not None:
+                    scheduler.bar_seen()  # مرز در انتظار دوباره گزارش نشود
             else:
-                wait_count += 1
-                if wait_count % 20 == 0:  # هر 10 ثانیه یک بار لاگ
-                    log(f"⏳ Waiting for new data... Current: {current_time} (wait cycles: {wait_count})", color='yellow', save_to_file=False)
+                waited = monotonic() - waiting_since
+                if waited >= next_wait_log:  # هر 10 ثانیه یک بار لاگ
+                    log(f"⏳ Waiting for new data... Current: {current_time} (waited {waited:.0f}s)", color='yellow', save_to_file=False)
+                    next_wait_log += 10
                 
                 # اگر خیلی زیاد انتظار کشیدیم، اجبار به پردازش (در صورت تست)
-                if wait_count >= max_wait_cycles:
-                    log(f"⚠️ Force processing after {wait_count} cycles without new data", color='magenta')
+                if waited >= max_wait_seconds:
+                    log(f"⚠️ Force processing after {waited:.0f}s without new data", color='magenta')
                     process_data = True
-                    wait_count = 0
+                    waiting_since, next_wait_log = monotonic(), 10
                 else:
                     process_data = False
+
+            # لمس فیبو 0.705 بین بسته شدن کندل‌ها، از روی تیک
+            tick_touch = False
+            if (not process_data and touch_detector is not None and state.fib_levels
+                    and not state.second_touch and last_swing_type is not None):
+                touch_detector.on_tick(snapshot.tick)
+                touch_event = touch_detector.check(state, last_swing_type)
+                if touch_event == 'first':
+                    log(f"⚡ Tick first touch on {last_swing_type}: {state.first_touch_value['timestamp']} status {state.first_touch_value['status']}", color='green')
+                elif touch_event == 'second':
+                    log(f"⚡ Tick second touch on {last_swing_type}: {state.second_touch_value['timestamp']} status {state.second_touch_value['status']}", color='green')
+                    process_data = True
+                    tick_touch = True
             
             if process_data:
+                last_bar = cache_data.bar(-2)  # آخرین کندل بسته‌شده
+                current_bar = cache_data.bar(-1)  # کندل در حال تشکیل
+                if touch_detector is not None and not tick_touch:
+                    touch_seen = touch_detector.on_bar_close(state, last_bar)
+                    touch_detector.seed(current_bar)
+                    if touch_seen is not None:
+                        log(f"⏱️ Tick touch seen {last_bar['time'] + 60 - touch_seen:.2f}s before bar close", color='cyan')
                 log((' ' * 80 + '\n') * 3)
                 log(f'Log number {i}:', color='lightred_ex')
                 log(f'📊 Processing {len(cache_data)} data points | Window: {window_size}', color='cyan')
                 log(f'Current time: {cache_data.index[-1]}', color='yellow')
-                log(f'Start index: {start_index}  value: {cache_data.iloc[0].timestamp}  end data: {cache_data.iloc[-2].timestamp}', color='yellow')
+                log(f'Start index: {start_index}  value: {cache_data.index[0]}  end data: {last_bar["timestamp"]}', color='yellow')
                 log(f'len data: {len(cache_data)} ', color='yellow')
-                log(f'Current data status: {cache_data.iloc[-1]["status"]} open: {cache_data.iloc[-1]["open"]} close: {cache_data.iloc[-1]["close"]} time: {cache_data.index[-1]}')
-                log(f'Last data status: {cache_data.iloc[-2]["status"]} open: {cache_data.iloc[-2]["open"]} close: {cache_data.iloc[-2]["close"]} time: {cache_data.index[-2]}')
+                log(f'Current data status: {current_bar["status"]} open: {current_bar["open"]} close: {current_bar["close"]} time: {current_bar["timestamp"]}')
+                log(f'Last data status: {last_bar["status"]} open: {last_bar["open"]} close: {last_bar["close"]} time: {last_bar["timestamp"]}')
                 log(f' ' * 80)
                 i += 1
                 
-                legs = get_legs(cache_data)
+                if leg_tracker is not None:
+                    # لگ‌های کل تاریخچه (نه فقط این پنجره)؛ معادل get_legs(cache_data) نیست، پیش‌فرض خاموش
+                    legs = leg_tracker.sync(cache_data)
+                    # لگ‌های قدیمی‌تر از پنجره فعلی برای بررسی سوئینگ قابل استفاده نیستند
+                    if len(legs) > 2 and legs[-3]['start'] < cache_data.index[0]:
+                        legs = get_legs(cache_data)
+                else:
+                    legs = get_legs(cache_data)
                 log(f'First len legs: {len(legs)}', color='green')
                 log(f' ' * 80)
 
                 if len(legs) > 2:
                     log(f'legs > 2', color='blue')
                     legs = legs[-3:]
-                    log(f"{cache_data.loc[legs[0]['start']].name} {cache_data.loc[legs[0]['end']].name} "
-                        f"{cache_data.loc[legs[1]['start']].name} {cache_data.loc[legs[1]['end']].name} "
-                        f"{cache_data.loc[legs[2]['start']].name} {cache_data.loc[legs[2]['end']].name}", color='yellow')
-                    swing_type, is_swing = get_swing_points(data=cache_data, legs=legs)
+                    log(f"{legs[0]['start']} {legs[0]['end']} "
+                        f"{legs[1]['start']} {legs[1]['end']} "
+                        f"{legs[2]['start']} {legs[2]['end']}", color='yellow')
+                    swing_type, is_swing = swing_cache.get_swing_points(data=cache_data, legs=legs)
 
 
                     # log(f'legs[1][start]start_value: {legs[1]['start_value']}', color='green')
@@ -371,9 +437,9 @@ def main():
 
                     # Phase 1 Initialization fib_levels or change by new fib
                     
-                    if is_swing:
+                    if is_swing and not tick_touch:
                         log(f"is_swing: {swing_type}")
-                        if swing_type == 'bullish' and cache_data.iloc[-2]['close'] > legs[1]['start_value']:
+                        if swing_type == 'bullish' and last_bar['close'] > legs[1]['start_value']:
                             state.reset()
                             state.fib_levels = fibonacci_retracement(start_price=legs[2]['end_value'], end_price=legs[2]['start_value'])
                             state.fib0_time = legs[2]['start']
@@ -381,7 +447,7 @@ def main():
                             last_swing_type = swing_type
                             log(f"📈 New fibonacci created: fib1:{state.fib_levels['1.0']} time:{legs[2]['start']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']} time:{legs[2]['end']}", color='green')
 
-                        elif swing_type == 'bearish' and cache_data.iloc[-2]['close'] < legs[1]['start_value']:
+                        elif swing_type == 'bearish' and last_bar['close'] < legs[1]['start_value']:
                             state.reset()
                             state.fib_levels = fibonacci_retracement(start_price=legs[2]['end_value'], end_price=legs[2]['start_value'])
                             state.fib0_time = legs[2]['start']
@@ -389,50 +455,50 @@ def main():
                             last_swing_type = swing_type
                             log(f"📉 New fibonacci created: fib1:{state.fib_levels['1.0']} time:{legs[2]['start']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']} time:{legs[2]['end']}", color='green')
 
-                    # Phase 2
-                    if state.fib_levels:
+                    # Phase 2 (در لمس تیکی، کندل بسته‌شده قبلاً پردازش شده است)
+                    if state.fib_levels and not tick_touch:
                         log(f'📊 Phase 2', color='blue')
                         if last_swing_type == 'bullish':
-                            if cache_data.iloc[-2]['high'] > state.fib_levels['0.0']:
-                                state.fib_levels = fibonacci_retracement(start_price=cache_data.iloc[-2]['high'], end_price=state.fib_levels['1.0'])
-                                state.fib0_time = cache_data.iloc[-2]['timestamp']
+                            if last_bar['high'] > state.fib_levels['0.0']:
+                                state.fib_levels = fibonacci_retracement(start_price=last_bar['high'], end_price=state.fib_levels['1.0'])
+                                state.fib0_time = last_bar['timestamp']
                                 state.first_touch = False
                                 state.first_touch_value = None
                                 # Should it be reset???
                                 log(f"📈 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
-                            elif cache_data.iloc[-2]['low'] < state.fib_levels['1.0']:
+                            elif last_bar['low'] < state.fib_levels['1.0']:
                                 state.reset()
                                 log(f"📈 Price dropped below fib1 on bullish and reset fib levels", color='red')
-                            elif cache_data.iloc[-2]['low'] <= state.fib_levels['0.705']:
-                                log(f"📈 Price touched fib0.705 on bullish -- cache_data status is {cache_data.iloc[-2]['status']}", color='red')
+                            elif last_bar['low'] <= state.fib_levels['0.705']:
+                                log(f"📈 Price touched fib0.705 on bullish -- cache_data status is {last_bar['status']}", color='red')
                                 if not state.first_touch:
-                                    state.first_touch_value = cache_data.iloc[-2]
+                                    state.first_touch_value = last_bar
                                     state.first_touch = True
                                     log(f"📈 First touch on bullish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='green')
-                                elif state.first_touch and not state.second_touch and cache_data.iloc[-2]['status'] != state.first_touch_value['status']:
-                                    state.second_touch_value = cache_data.iloc[-2]
+                                elif state.first_touch and not state.second_touch and last_bar['status'] != state.first_touch_value['status']:
+                                    state.second_touch_value = last_bar
                                     state.second_touch = True
                                     log(f"📈 Second touch on bullish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='green')
 
                         elif last_swing_type == 'bearish':
-                            if cache_data.iloc[-2]['low'] < state.fib_levels['0.0']:
-                                state.fib_levels = fibonacci_retracement(start_price=cache_data.iloc[-2]['low'], end_price=state.fib_levels['1.0'])
-                                state.fib0_time = cache_data.iloc[-2]['timestamp']
+                            if last_bar['low'] < state.fib_levels['0.0']:
+                                state.fib_levels = fibonacci_retracement(start_price=last_bar['low'], end_price=state.fib_levels['1.0'])
+                                state.fib0_time = last_bar['timestamp']
                                 state.first_touch = False
                                 state.first_touch_value = None
                                 # Should it be reset???
                                 log(f"📉 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
-                            elif cache_data.iloc[-2]['high'] > state.fib_levels['1.0']:
+                            elif last_bar['high'] > state.fib_levels['1.0']:
                                 state.reset()
                                 log(f"📉 Price dropped below fib1 on bearish and reset fib levels", color='red')
-                            elif cache_data.iloc[-2]['high'] >= state.fib_levels['0.705']:
-                                log(f"📉 Price touched fib0.705 on bearish -- cache_data status is {cache_data.iloc[-2]['status']}", color='red')
+                            elif last_bar['high'] >= state.fib_levels['0.705']:
+                                log(f"📉 Price touched fib0.705 on bearish -- cache_data status is {last_bar['status']}", color='red')
                                 if not state.first_touch:
-                                    state.first_touch_value = cache_data.iloc[-2]
+                                    state.first_touch_value = last_bar
                                     state.first_touch = True
                                     log(f"📉 First touch on bearish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='red')
-                                elif state.first_touch and not state.second_touch and cache_data.iloc[-2]['status'] != state.first_touch_value['status']:
-                                    state.second_touch_value = cache_data.iloc[-2]
+                                elif state.first_touch and not state.second_touch and last_bar['status'] != state.first_touch_value['status']:
+                                    state.second_touch_value = last_bar
                                     state.second_touch = True
                                     log(f"📉 Second touch on bearish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='red')
 
@@ -441,49 +507,49 @@ def main():
 
                 if len(legs) < 3:
                     # Phase 3
-                    if state.fib_levels:
+                    if state.fib_levels and not tick_touch:
                         log(f"📊 Phase 3", color='blue')
                         if last_swing_type == 'bullish':
-                            if cache_data.iloc[-2]['high'] > state.fib_levels['0.0']:
-                                state.fib_levels = fibonacci_retracement(start_price=cache_data.iloc[-2]['high'], end_price=state.fib_levels['1.0'])
-                                state.fib0_time = cache_data.iloc[-2]['timestamp']
+                            if last_bar['high'] > state.fib_levels['0.0']:
+                                state.fib_levels = fibonacci_retracement(start_price=last_bar['high'], end_price=state.fib_levels['1.0'])
+                                state.fib0_time = last_bar['timestamp']
                                 state.first_touch = False
                                 state.first_touch_value = None
                                 # Should it be reset???
                                 log(f"📈 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
-                            elif cache_data.iloc[-2]['low'] < state.fib_levels['1.0']:
+                            elif last_bar['low'] < state.fib_levels['1.0']:
                                 state.reset()
                                 log(f"📈 Price dropped below fib1 on bullish and reset fib levels", color='red')
-                            elif cache_data.iloc[-2]['low'] <= state.fib_levels['0.705']:
-                                log(f"📈 Price touched fib0.705 on bullish -- cache_data status is {cache_data.iloc[-2]['status']}", color='red')
+                            elif last_bar['low'] <= state.fib_levels['0.705']:
+                                log(f"📈 Price touched fib0.705 on bullish -- cache_data status is {last_bar['status']}", color='red')
                                 if not state.first_touch:
                                     state.first_touch = True
-                                    state.first_touch_value = cache_data.iloc[-2]
+                                    state.first_touch_value = last_bar
                                     log(f"📈 First touch on bullish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='green')
-                                elif state.first_touch and not state.second_touch and cache_data.iloc[-2]['status'] != state.first_touch_value['status']:
+                                elif state.first_touch and not state.second_touch and last_bar['status'] != state.first_touch_value['status']:
                                     state.second_touch = True
-                                    state.second_touch_value = cache_data.iloc[-2]
+                                    state.second_touch_value = last_bar
                                     log(f"📈 Second touch on bullish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='green')
 
                         elif last_swing_type == 'bearish':
-                            if cache_data.iloc[-2]['low'] < state.fib_levels['0.0']:
-                                state.fib_levels = fibonacci_retracement(start_price=cache_data.iloc[-2]['low'], end_price=state.fib_levels['1.0'])
-                                state.fib0_time = cache_data.iloc[-2]['timestamp']
+                            if last_bar['low'] < state.fib_levels['0.0']:
+                                state.fib_levels = fibonacci_retracement(start_price=last_bar['low'], end_price=state.fib_levels['1.0'])
+                                state.fib0_time = last_bar['timestamp']
                                 state.first_touch = False
                                 state.first_touch_value = None
                                 # Should it be reset???
                                 log(f"📉 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
-                            elif cache_data.iloc[-2]['high'] > state.fib_levels['1.0']:
+                            elif last_bar['high'] > state.fib_levels['1.0']:
                                 state.reset()
                                 log(f"📉 Price dropped below fib1 on bearish and reset fib levels", color='red')
-                            elif cache_data.iloc[-2]['high'] >= state.fib_levels['0.705']:
-                                log(f"📉 Price touched fib0.705 on bearish -- cache_data status is {cache_data.iloc[-2]['status']}", color='red')
+                            elif last_bar['high'] >= state.fib_levels['0.705']:
+                                log(f"📉 Price touched fib0.705 on bearish -- cache_data status is {last_bar['status']}", color='red')
                                 if not state.first_touch:
-                                    state.first_touch_value = cache_data.iloc[-2]
+                                    state.first_touch_value = last_bar
                                     state.first_touch = True
                                     log(f"📉 First touch on bearish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='red')
-                                elif state.first_touch and not state.second_touch and cache_data.iloc[-2]['status'] != state.first_touch_value['status']:
-                                    state.second_touch_value = cache_data.iloc[-2]
+                                elif state.first_touch and not state.second_touch and last_bar['status'] != state.first_touch_value['status']:
+                                    state.second_touch_value = last_bar
                                     state.second_touch = True
                                     log(f"📉 Second touch on bearish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='red')
 
@@ -547,9 +613,9 @@ def main():
                             continue
                     
                     log(f"📈 Buy signal triggered", color='green')
-                    last_tick = mt5.symbol_info_tick(MT5_CONFIG['symbol'])
+                    last_tick = snapshot.tick
                     buy_entry_price = last_tick.ask
-                    log(f'Start long position income {cache_data.iloc[-1].name}', color='blue')
+                    log(f'Start long position income {current_bar["timestamp"]}', color='blue')
                     log(f'current_open_point (market ask): {buy_entry_price}', color='blue')
                     # ENTRY CONTEXT (BUY): fib snapshot + touches
                     try:
@@ -675,7 +741,7 @@ def main():
                         log(f'log_signal failed: {e}', color='yellow')
                     
                     # گرفتن tick جدید قبل از ارسال سفارش (برای اطمینان از قیمت‌های به‌روز)
-                    last_tick = mt5.symbol_info_tick(MT5_CONFIG['symbol'])
+                    last_tick = snapshot.refresh('tick')
                     
                     # اگر پوزیشن ریورس شده، SL و TP رو بر اساس قیمت واقعی معامله محاسبه کن
                     if m15_action == 'EXECUTE_REVERSED' and trade_type == 'sell':
@@ -687,23 +753,16 @@ def main():
                         trade_tp = actual_entry - (original_stop_distance * win_ratio)  # TP پایین entry
                         log(f'🔄 Recalculated for SELL: entry={actual_entry:.5f} SL={trade_sl:.5f} TP={trade_tp:.5f}', color='yellow')
                     
-                    # ارسال سفارش با پارامترهای نهایی
-                    if trade_type == 'buy':
-                        result = mt5_conn.open_buy_position(
-                            tick=last_tick,
-                            sl=trade_sl,
-                            tp=trade_tp,
-                            comment=trade_comment,
-                            risk_pct=MT5_CONFIG['risk_percent']
-                        )
-                    else:
-                        result = mt5_conn.open_sell_position(
-                            tick=last_tick,
-                            sl=trade_sl,
-                            tp=trade_tp,
-                            comment=trade_comment,
-                            risk_pct=MT5_CONFIG['risk_percent']
-                        )
+                    # ارسال سفارش با پارامترهای نهایی (در order lane؛ نتیجه در report_order لاگ می‌شود)
+                    order_lane.open_position(
+                        trade_type,
+                        callback=report_order(trade_type),
+                        tick=last_tick,
+                        sl=trade_sl,
+                        tp=trade_tp,
+                        comment=trade_comment,
+                        risk_pct=MT5_CONFIG['risk_percent']
+                    )
                     
                     # ارسال ایمیل غیرمسدودکننده
                     try:
@@ -724,26 +783,6 @@ def main():
                     except Exception as _e:
                         log(f'Email dispatch failed: {_e}', color='red')
 
-                    if result and getattr(result, 'retcode', None) == 10009:
-                        log(f'✅ {trade_type.upper()} order executed successfully', color='green')
-                        log(f'📊 Ticket={result.order} Price={result.price} Volume={result.volume}', color='cyan')
-                        # # ارسال ایمیل غیرمسدودکننده
-                        # try:
-                        #     send_trade_email_async(
-                        #         subject = f"Last order result",
-                        #         body=(
-                        #             f"Ticket={result.order}\n"
-                        #             f"Price={result.price}\n"
-                        #             f"Volume={result.volume}\n"
-                        #         )
-                        #     )
-                        # except Exception as _e:
-                        #     log(f'Email dispatch failed: {_e}', color='red')
-                    else:
-                        if result:
-                            log(f'❌ {trade_type.upper()} failed retcode={result.retcode} comment={result.comment}', color='red')
-                        else:
-                            log(f'❌ {trade_type.upper()} failed (no result object)', color='red')
                     state.reset()
 
                     reset_state_and_window()
@@ -802,9 +841,9 @@ def main():
                             continue
                     
                     log(f"📉 Sell signal triggered", color='red')
-                    last_tick = mt5.symbol_info_tick(MT5_CONFIG['symbol'])
+                    last_tick = snapshot.tick
                     sell_entry_price = last_tick.bid
-                    log(f'Start short position income {cache_data.iloc[-1].name}', color='red')
+                    log(f'Start short position income {current_bar["timestamp"]}', color='red')
                     log(f'current_open_point (market bid): {sell_entry_price}', color='red')
                     # ENTRY CONTEXT (SELL): fib snapshot + touches
                     try:
@@ -923,7 +962,7 @@ def main():
                         log(f'log_signal failed: {e}', color='yellow')
                     
                     # گرفتن tick جدید قبل از ارسال سفارش (برای اطمینان از قیمت‌های به‌روز)
-                    last_tick = mt5.symbol_info_tick(MT5_CONFIG['symbol'])
+                    last_tick = snapshot.refresh('tick')
                     
                     # اگر پوزیشن ریورس شده، SL و TP رو بر اساس قیمت واقعی معامله محاسبه کن
                     if m15_action == 'EXECUTE_REVERSED' and trade_type == 'buy':
@@ -935,23 +974,16 @@ def main():
                         trade_tp = actual_entry + (original_stop_distance * win_ratio)  # TP بالای entry
                         log(f'🔄 Recalculated for BUY: entry={actual_entry:.5f} SL={trade_sl:.5f} TP={trade_tp:.5f}', color='yellow')
                     
-                    # ارسال سفارش با پارامترهای نهایی
-                    if trade_type == 'sell':
-                        result = mt5_conn.open_sell_position(
-                            tick=last_tick,
-                            sl=trade_sl,
-                            tp=trade_tp,
-                            comment=trade_comment,
-                            risk_pct=MT5_CONFIG['risk_percent']
-                        )
-                    else:
-                        result = mt5_conn.open_buy_position(
-                            tick=last_tick,
-                            sl=trade_sl,
-                            tp=trade_tp,
-                            comment=trade_comment,
-                            risk_pct=MT5_CONFIG['risk_percent']
-                        )
+                    # ارسال سفارش با پارامترهای نهایی (در order lane؛ نتیجه در report_order لاگ می‌شود)
+                    order_lane.open_position(
+                        trade_type,
+                        callback=report_order(trade_type),
+                        tick=last_tick,
+                        sl=trade_sl,
+                        tp=trade_tp,
+                        comment=trade_comment,
+                        risk_pct=MT5_CONFIG['risk_percent']
+                    )
                     
                     # ارسال ایمیل غیرمسدودکننده
                     try:
@@ -972,26 +1004,6 @@ def main():
                     except Exception as _e:
                         log(f'Email dispatch failed: {_e}', color='red')
                     
-                    if result and getattr(result, 'retcode', None) == 10009:
-                        log(f'✅ {trade_type.upper()} order executed successfully', color='green')
-                        log(f'📊 Ticket={result.order} Price={result.price} Volume={result.volume}', color='cyan')
-                        # ارسال ایمیل غیرمسدودکننده
-                        # try:
-                        #     send_trade_email_async(
-                        #         subject = f"Last order result",
-                        #         body=(
-                        #             f"Ticket={result.order}\n"
-                        #             f"Price={result.price}\n"
-                        #             f"Volume={result.volume}\n"
-                        #         )
-                        #     )
-                        # except Exception as _e:
-                        #     log(f'Email dispatch failed: {_e}', color='red')
-                    else:
-                        if result:
-                            log(f'❌ {trade_type.upper()} failed retcode={result.retcode} comment={result.comment}', color='red')
-                        else:
-                            log(f'❌ {trade_type.upper()} failed (no result object)', color='red')
                     state.reset()
 
                     reset_state_and_window()
@@ -999,7 +1011,7 @@ def main():
                 
                 # log(f'cache_data.iloc[-1].name: {cache_data.iloc[-1].name}', color='lightblue_ex')
                 # log(f'Total cache_data len: {len(cache_data)} | window_size: {window_size}', color='cyan')
-                log(f'len(legs): {len(legs)} | start_index: {start_index} | {cache_data.iloc[start_index].name}', color='lightred_ex')
+                log(f'len(legs): {len(legs)} | start_index: {start_index} | {cache_data.index[start_index]}', color='lightred_ex')
                 log(f' ' * 80)
                 log(f'-'* 80)
                 log(f' ' * 80)
@@ -1008,7 +1020,7 @@ def main():
                 # last_data_time = cache_data.index[-1]  # این خط حذف شد چون بالا انجام شد
 
             # بررسی وضعیت پوزیشن‌های باز
-            positions = mt5_conn.get_positions()
+            positions = snapshot.positions
             if positions is None or len(positions) == 0:
                 if position_open:
                     log("🏁 All positions closed", color='yellow')
@@ -1021,34 +1033,39 @@ def main():
 
             manage_open_positions()
 
-            sleep(0.5)  # مطابق main_saver_copy2.py
+            # با لمس اول فعال، تیک‌ها سریع‌تر خوانده می‌شوند
+            touch_armed = touch_detector is not None and bool(state.fib_levels) and not state.second_touch
+            if scheduler is None:
+                sleep(TRADING_CONFIG.get('tick_touch_poll', 0.1) if touch_armed else 0.5)  # مطابق main_saver_copy2.py
+            elif scheduler.wait(TRADING_CONFIG.get('tick_touch_poll', 0.1) if touch_armed else None):
+                bar_due = True
 
         except KeyboardInterrupt:
             log("🛑 Bot stopped by user", color='yellow')
-            mt5_conn.close_all_positions()
+            order_lane.close_all().result()
             break
         except Exception as e:
             log(f' ' * 80)
             log(f"❌ Error: {e}", color='red')
             sleep(5)
 
+    order_lane.shutdown()
     mt5_conn.shutdown()
     print("🔌 MT5 connection closed")
 
 def _pip_size_for(symbol: str) -> float:
-    info = mt5.symbol_info(symbol)
-    if not info:
+    spec = symbol_specs.get(symbol)
+    if not spec:
         return 0.0001
     # برای 5/3 رقمی: 1 pip = 10 * point
-    return info.point * (10.0 if info.digits in (3, 5) else 1.0)
+    return spec.pip_size
 
 def _min_stop_distance(symbol: str) -> float:
-    info = mt5.symbol_info(symbol)
-    if not info:
+    spec = symbol_specs.get(symbol)
+    if not spec:
         return 0.0003
-    point = info.point
     # حداقل فاصله مجاز بروکر (stops_level) یا 3 پوینت به‌عنوان فfallback
-    return max((getattr(info, 'trade_stops_level', 0) or 0) * point, 3 * point)
+    return spec.min_stop_distance()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from indicators import candle_features
+
+# ستون‌های مجازی که از فیلدهای آرایه MT5 ساخته می‌شوند
+_ALIASES = {'volume': 'tick_volume'}
+
+
+@lru_cache(maxsize=4096)
+def epoch_to_local(epoch: int, tz) -> pd.Timestamp:
+    """Convert one epoch-seconds value to a tz-aware Timestamp (cached per value)."""
+    return pd.Timestamp(int(epoch), unit='s', tz='UTC').tz_convert(tz)
+
+
+def to_epoch(value) -> int:
+    """Epoch seconds of an int, numpy integer, Timestamp or aware datetime."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(pd.Timestamp(value).timestamp())
+
+
+class EpochIndex:
+    """
+    Time index kept as int64 epoch seconds. Looking up a row returns a local
+    (Asia/Tehran) Timestamp converted on demand, so only rows that are actually
+    shown, logged or stored as leg endpoints are ever converted. Supports the
+    subset of pandas.Index the strategy uses (item access, len, searchsorted,
+    get_indexer).
+    """
+
+    def __init__(self, epochs, tz):
+        self.epochs = epochs
+        self.tz = tz
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def __getitem__(self, i):
+        return epoch_to_local(int(self.epochs[i]), self.tz)
+
+    def searchsorted(self, value, side='left'):
+        return np.searchsorted(self.epochs, to_epoch(value), side=side)
+
+    def get_indexer(self, values):
+        keys = np.array([to_epoch(v) for v in values], dtype=np.int64)
+        pos = np.searchsorted(self.epochs, keys)
+        found = (pos < len(self.epochs)) & (self.epochs[np.minimum(pos, len(self.epochs) - 1)] == keys)
+        return np.where(found, pos, -1)
+
+    def to_pandas(self):
+        return pd.to_datetime(self.epochs, unit='s', utc=True).tz_convert(self.tz)
+
+
+class MarketWindow:
+    """
+    Read-only window over an MT5 rates array (oldest first, last row = forming bar).
+
+    Columns are handed out as zero-copy field views (window['close']), so
+    get_legs, get_swing_points and the phase logic work on the broker's array
+    directly; candle features (window['bearish'], window['body_ratio'], ...)
+    come from a per-bar feature array aligned with it. When the arrays are
+    the connector's rolling buffers they are updated in place by the next
+    poll, i.e. a window is valid for one cycle; bar() returns plain-value
+    copies that are safe to keep. Times stay int64 epoch seconds
+    (window['time']); index converts single rows to Tehran time on demand.
+    to_frame() builds the DataFrame that get_historical_data used to return,
+    for logging/debugging only.
+    """
+
+    def __init__(self, rates, tz=None, features=None):
+        self.rates = rates
+        self.tz = tz or pytz.timezone('Asia/Tehran')
+        self._index = None
+        self._features = features
+
+    def __len__(self):
+        return len(self.rates)
+
+    def __contains__(self, name):
+        return name in self.rates.dtype.names or name in _ALIASES or name in self.features.dtype.names
+
+    def __getitem__(self, name):
+        if name in self.rates.dtype.names or name in _ALIASES:
+            return self.rates[_ALIASES.get(name, name)]
+        return self.features[name]
+
+    @property
+    def features(self):
+        """
+        Per-bar candle features (indicators.FEATURE_DTYPE) aligned with rates:
+        the connector's buffer computed once per closed bar, or computed here
+        once per window.
+        """
+        if self._features is None:
+            self._features = candle_features(self.rates)
+        return self._features
+
+    @property
+    def bearish(self):
+        """Boolean 'status == bearish' array (open > close)."""
+        return self.features['bearish']
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = EpochIndex(self.rates['time'], self.tz)
+        return self._index
+
+    def bar(self, i):
+        """One bar as a dict with the keys the strategy reads from a DataFrame row."""
+        row = self.rates[i]
+        timestamp = self.index[i]
+        return {
+            'time': int(row['time']),
+            'timestamp': timestamp,
+            'open': float(row['open']),
+            'high': float(row['high']),
+            'low': float(row['low']),
+            'close': float(row['close']),
+            'volume': int(row['tick_volume']),
+            'spread': int(row['spread']),
+            'status': 'bearish' if self.features['bearish'][i] else 'bullish',
+        }
+
+    def to_frame(self):
+        df = pd.DataFrame(self.rates)
+        df['time'] = self.index.to_pandas()
+        df.set_index('time', inplace=True)
+        df = df.rename(columns={'tick_volume': 'volume'})
+        df['timestamp'] = df.index
+        df['status'] = np.where(self.bearish, 'bearish', 'bullish')
+        return df
@@ -64,6 +64,12 @@ MT5_CONFIG = {
     'max_daily_trades': 10,
     'trading_hours': FULL_TIME_IRAN,
     'risk_percent': 0.02,  # 2% ریسک در هر معامله
+    'bar_store': True,  # ذخیره کندل‌های بسته‌شده روی دیسک (memmap) برای بک‌تست و شروع گرم
+    'bar_store_dir': None,  # None: trading-analytics-logger/data/bars
+    'aggregate_periods': [900],  # کندل‌های M15 ساخته‌شده از M1 برای فیلتر M15 (3600 برای H1)
+    'symbol_spec_ttl': 60,  # ثانیه؛ مشخصات نماد (digits/point/stops/volume/filling) حداکثر یک بار در این بازه از ترمینال خوانده می‌شود
+    'filling_memory': True,  # یادگیری و ذخیره type_filling موفق برای هر بروکر/نماد
+    'filling_memory_file': None,  # None: trading-analytics-logger/data/filling_modes.json
 }
 
 # تنظیمات استراتژی
@@ -79,6 +85,12 @@ TRADING_CONFIG = {
     # 'touch_epsilon_pips': 0.15,
     'prevent_multiple_positions': True,  # جلوگیری از باز کردن پوزیشن‌های متعدد همزمان
     'position_check_mode': 'all',  # 'all': همه پوزیشن‌ها، 'conflicting': فقط پوزیشن‌های مخالف
+    'incremental_legs': False,  # True: LegTracker افزایشی به‌جای get_legs روی کل پنجره؛ لگ‌ها از کل تاریخچه‌اند و بعد از جابه‌جایی پنجره با get_legs(پنجره) یکی نیستند
+    'bar_aligned_scheduler': True,  # بیدار شدن روی مرز کندل‌ها (M1/M15) به‌جای polling ثابت 0.5 ثانیه
+    'tick_touch': False,  # True: لمس فیبو 0.705 از روی تیک‌های کندل در حال تشکیل (بدون انتظار برای بسته شدن)
+    'tick_touch_status': 'live',  # 'live': لمس دوم درون کندل | 'close': مثل قوانین کندل بسته، فقط اندازه‌گیری تأخیر
+    'tick_touch_poll': 0.1,  # فاصله خواندن تیک (ثانیه) وقتی فیبو فعال است
+    'order_lane': True,  # ارسال سفارش‌ها روی thread جدا (صف + future)؛ False: همان سیکل، بدون thread
 }
 
 # مدیریت پویا چند مرحله‌ای جدید - 19 مرحله (2R تا 20R)
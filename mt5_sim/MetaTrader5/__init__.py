@@ -0,0 +1,556 @@
+"""
+Offline stand-in for the MetaTrader5 package.
+
+Replays recorded M1 bars (and optionally ticks) on a simulated clock and
+fills orders against the replayed prices, so main_metatrader_new.py and the
+test_*.py scripts run unchanged on machines without a terminal:
+
+    PYTHONPATH=mt5_sim MT5_SIM_BARS=trading-analytics-logger/data/bars/EURUSD_M1.bars \\
+        python -m MetaTrader5 main_metatrader_new:main
+
+Settings (environment, or configure(...) before initialize()):
+    MT5_SIM_BARS      M1 bars: a bar store file (*.bars) or a structured .npy;
+                      unset -> a seeded synthetic random walk
+    MT5_SIM_TICKS     optional .npy with time_msc, bid, ask fields; unset ->
+                      four ticks per bar (open, low/high, high/low, close)
+    MT5_SIM_SYMBOL    symbol name (default EURUSD)
+    MT5_SIM_START     bars of history before the replay starts (default 1000)
+    MT5_SIM_SPEED     clock speed-up; 0 = virtual clock, sleep() returns at once
+                      (default 0)
+    MT5_SIM_BALANCE   starting balance (default 1000)
+    MT5_SIM_FILLINGS  accepted type_filling values, e.g. "IOC,FOK" (default)
+
+Importing the package changes nothing outside it. Only inside replay() (or
+between start() and stop()) are time.time, time.monotonic and time.sleep
+replaced by the simulated clock, so session checks, the bar scheduler,
+TTLs and sleeps follow replay time; start it before importing modules that
+bind them at import (`from time import sleep`), as `python -m MetaTrader5`
+does. When the data
+runs out, the replay clock's sleep() raises ReplayFinished, a BaseException
+so the bot's `except Exception` handlers do not swallow it. Without the
+clock patch, virtual time only moves through advance(seconds).
+
+Fills: market orders at the current ask/bid, SL/TP hit on the first tick
+through the level and filled at the level, profit = price move * volume *
+contract size (USD-quoted symbol, USD account). API calls are serialized by
+a module lock, so a bot thread sending orders cannot race the fill engine.
+"""
+
+import os
+import threading
+import time as _time
+from contextlib import contextmanager
+from functools import wraps
+from types import SimpleNamespace
+
+import numpy as np
+
+# ---------- Constants (same values as the real package) ----------
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_SLTP = 6
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+ORDER_TIME_GTC = 0
+SYMBOL_FILLING_FOK = 1
+SYMBOL_FILLING_IOC = 2
+SYMBOL_TRADE_MODE_FULL = 4
+
+TRADE_RETCODE_PLACED = 10008
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_MARKET_CLOSED = 10018
+TRADE_RETCODE_INVALID_FILL = 10030
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+RES_S_OK = 1
+
+_PERIODS = {TIMEFRAME_M1: 60, TIMEFRAME_M5: 300, TIMEFRAME_M15: 900, TIMEFRAME_M30: 1800,
+            TIMEFRAME_H1: 3600, TIMEFRAME_H4: 14400, TIMEFRAME_D1: 86400}
+_FILLING_NAMES = {'FOK': ORDER_FILLING_FOK, 'IOC': ORDER_FILLING_IOC, 'RETURN': ORDER_FILLING_RETURN}
+
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+_real_time = _time.time
+_real_sleep = _time.sleep
+
+
+# ---------- Simulated clock ----------
+class _Clock:
+    def __init__(self):
+        self.speed = 0.0
+        self.now = None
+        self.end = None
+        self._wall0 = None
+        self._sim0 = None
+
+    def start(self, sim_now, end, speed):
+        self.speed = speed
+        self.now = float(sim_now)
+        self.end = end
+        self._wall0 = _real_time()
+        self._sim0 = self.now
+
+    def time(self):
+        if self.now is None:
+            return _real_time()
+        if self.speed > 0:
+            return self._sim0 + (_real_time() - self._wall0) * self.speed
+        return self.now
+
+    def sleep(self, seconds):
+        if self.now is None:
+            return _real_sleep(seconds)
+        seconds = max(float(seconds), 0.0)
+        if self.speed > 0:
+            _real_sleep(seconds / self.speed)
+        else:
+            self.now += seconds
+        if self.end is not None and self.time() > self.end:
+            raise ReplayFinished("MT5 replay finished")
+
+
+class ReplayFinished(BaseException):
+    """The replay ran out of data."""
+
+
+_clock = _Clock()
+
+
+# ---------- Replay data ----------
+def _synthetic_bars(n=20000, seed=0, start=1_700_000_040):
+    rng = np.random.default_rng(seed)
+    bars = np.zeros(n, RATES_DTYPE)
+    close = 1.08 + np.cumsum(rng.normal(0, 0.00015, n))
+    open_ = np.r_[close[0], close[:-1]] + rng.normal(0, 0.00002, n)
+    wick = np.abs(rng.normal(0, 0.0001, (2, n)))
+    bars['time'] = start // 60 * 60 + np.arange(n) * 60
+    bars['open'] = open_.round(5)
+    bars['close'] = close.round(5)
+    bars['high'] = (np.maximum(open_, close) + wick[0]).round(5)
+    bars['low'] = (np.minimum(open_, close) - wick[1]).round(5)
+    bars['tick_volume'] = 4
+    bars['spread'] = 10
+    return bars
+
+
+def _load_bars(path):
+    if not path:
+        return _synthetic_bars()
+    if path.endswith('.npy'):
+        return np.load(path).astype(RATES_DTYPE)
+    return np.fromfile(path, dtype=RATES_DTYPE)
+
+
+def _ticks_from_bars(bars, point):
+    """Four ticks per bar: open, the nearer extreme, the other extreme, close."""
+    bullish = bars['close'] >= bars['open']
+    first = np.where(bullish, bars['low'], bars['high'])
+    second = np.where(bullish, bars['high'], bars['low'])
+    bid = np.stack([bars['open'], first, second, bars['close']], axis=1).reshape(-1)
+    t = (bars['time'][:, None] + np.array([0.0, 15.0, 30.0, 59.0])).reshape(-1)
+    ask = bid + np.repeat(bars['spread'], 4) * point
+    return t, bid, ask
+
+
+class _Sim:
+    def __init__(self, symbol, bars, ticks=None, start=1000, speed=0.0, balance=1000.0, fillings=('IOC', 'FOK')):
+        self.symbol = symbol
+        self.point = 0.001 if symbol.endswith('JPY') else 0.00001
+        self.digits = 3 if symbol.endswith('JPY') else 5
+        self.contract_size = 100000.0
+        self.bars = bars
+        if ticks is not None:
+            self.t = ticks['time_msc'] / 1000.0
+            self.bid = ticks['bid'].astype(float)
+            self.ask = ticks['ask'].astype(float)
+        else:
+            self.t, self.bid, self.ask = _ticks_from_bars(bars, self.point)
+        self.fillings = {_FILLING_NAMES[f.strip().upper()] for f in fillings if f.strip()}
+        self.balance = float(balance)
+        self.positions = {}
+        self.deals = []
+        self.next_ticket = 1000
+        self.checked = 0  # اولین تیکی که هنوز برای SL/TP بررسی نشده
+        self.last_error = (RES_S_OK, 'Success')
+        start = min(max(int(start), 1), len(bars) - 1)
+        _clock.start(bars['time'][start], float(self.t[-1]), speed)
+
+    # ---------- Market state ----------
+    def visible(self):
+        """Number of ticks up to the simulated now."""
+        return int(np.searchsorted(self.t, _clock.time(), side='right'))
+
+    def tick(self, n=None):
+        n = self.visible() if n is None else n
+        if n == 0:
+            return None
+        i = n - 1
+        t = float(self.t[i])
+        return SimpleNamespace(time=int(t), time_msc=int(t * 1000), bid=float(self.bid[i]),
+                               ask=float(self.ask[i]), last=0.0, volume=0, flags=0, volume_real=0.0)
+
+    def m1_rates(self, n, rows):
+        """Last `rows` M1 rates up to tick n, forming bar built from its ticks."""
+        if n == 0:
+            return np.empty(0, RATES_DTYPE)
+        bucket = int(self.t[n - 1]) // 60 * 60
+        k = int(np.searchsorted(self.bars['time'], bucket))
+        closed = self.bars[max(k - rows + 1, 0):k]
+        forming = np.zeros(1, RATES_DTYPE)
+        if k < len(self.bars) and self.bars['time'][k] == bucket:
+            forming[0] = self.bars[k]
+        forming['time'] = bucket
+        i0 = int(np.searchsorted(self.t, bucket))
+        bid = self.bid[i0:n]
+        forming['open'] = bid[0]
+        forming['high'] = bid.max()
+        forming['low'] = bid.min()
+        forming['close'] = bid[-1]
+        forming['tick_volume'] = len(bid)
+        return np.concatenate([closed, forming])
+
+    def rates(self, timeframe, start, count):
+        period = _PERIODS.get(timeframe)
+        if period is None:
+            self.last_error = (-2, 'Invalid params')
+            return None
+        n = self.visible()
+        need = start + count
+        if period == 60:
+            rates = self.m1_rates(n, need)
+        else:
+            m1 = self.m1_rates(n, (need + 1) * (period // 60))
+            rates = _aggregate(m1, period)
+        return rates[max(len(rates) - need, 0):len(rates) - start].copy()
+
+    # ---------- Fill engine ----------
+    def process(self):
+        """Close positions whose SL/TP was crossed by ticks since the last call."""
+        n = self.visible()
+        lo = self.checked
+        if n <= lo:
+            return
+        for pos in list(self.positions.values()):
+            buy = pos.type == POSITION_TYPE_BUY
+            price = self.bid[lo:n] if buy else self.ask[lo:n]
+            hits = []
+            if pos.sl:
+                hit = np.flatnonzero(price <= pos.sl if buy else price >= pos.sl)
+                if len(hit):
+                    hits.append((hit[0], pos.sl, 'sl'))
+            if pos.tp:
+                hit = np.flatnonzero(price >= pos.tp if buy else price <= pos.tp)
+                if len(hit):
+                    hits.append((hit[0], pos.tp, 'tp'))
+            if hits:
+                idx, level, reason = min(hits, key=lambda h: h[0])
+                self.close(pos, level, pos.volume, f'[{reason} {level}]', float(self.t[lo + idx]))
+        self.checked = n
+        tick = self.tick(n)
+        for pos in self.positions.values():
+            pos.price_current = tick.bid if pos.type == POSITION_TYPE_BUY else tick.ask
+            pos.profit = self.pnl(pos, pos.price_current, pos.volume)
+
+    def pnl(self, pos, price, volume):
+        sign = 1.0 if pos.type == POSITION_TYPE_BUY else -1.0
+        return round(sign * (price - pos.price_open) * volume * self.contract_size, 2)
+
+    def close(self, pos, price, volume, comment, t):
+        volume = min(volume, pos.volume)
+        profit = self.pnl(pos, price, volume)
+        self.balance += profit
+        self.deals.append(SimpleNamespace(ticket=self.next_ticket, position_id=pos.ticket, time=int(t),
+                                          type=1 - pos.type, volume=volume, price=price, profit=profit,
+                                          symbol=pos.symbol, magic=pos.magic, comment=comment, entry=1))
+        self.next_ticket += 1
+        pos.volume = round(pos.volume - volume, 8)
+        if pos.volume <= 0:
+            del self.positions[pos.ticket]
+        return profit
+
+    def result(self, retcode, request, comment, price=0.0, volume=0.0, order=0, deal=0):
+        tick = self.tick()
+        if retcode != TRADE_RETCODE_DONE:
+            self.last_error = (retcode, comment)
+        return SimpleNamespace(retcode=retcode, deal=deal, order=order, volume=volume, price=price,
+                               bid=tick.bid if tick else 0.0, ask=tick.ask if tick else 0.0,
+                               comment=comment, request_id=0, retcode_external=0, request=request)
+
+    def send(self, request):
+        self.process()
+        tick = self.tick()
+        if tick is None:
+            return self.result(TRADE_RETCODE_MARKET_CLOSED, request, 'Market closed')
+        action = request.get('action')
+        if action == TRADE_ACTION_SLTP:
+            pos = self.positions.get(request.get('position'))
+            if pos is None:
+                return self.result(TRADE_RETCODE_POSITION_CLOSED, request, 'Position closed')
+            sl = request.get('sl', pos.sl) or 0.0
+            tp = request.get('tp', pos.tp) or 0.0
+            if not self.stops_ok(pos.type, tick.bid if pos.type == POSITION_TYPE_BUY else tick.ask, sl, tp):
+                return self.result(TRADE_RETCODE_INVALID_STOPS, request, 'Invalid stops')
+            pos.sl, pos.tp = float(sl), float(tp)
+            return self.result(TRADE_RETCODE_DONE, request, 'Request executed', order=pos.ticket)
+        if action != TRADE_ACTION_DEAL:
+            return self.result(TRADE_RETCODE_INVALID, request, 'Invalid request')
+        if request.get('symbol') != self.symbol:
+            return self.result(TRADE_RETCODE_INVALID, request, 'Unknown symbol')
+        filling = request.get('type_filling')
+        if filling is not None and filling not in self.fillings:
+            return self.result(TRADE_RETCODE_INVALID_FILL, request, 'Unsupported filling mode')
+        volume = float(request.get('volume') or 0.0)
+        if not 0.01 <= volume <= 100.0:
+            return self.result(TRADE_RETCODE_INVALID_VOLUME, request, 'Invalid volume')
+        order_type = request.get('type')
+        price = tick.ask if order_type == ORDER_TYPE_BUY else tick.bid
+
+        if request.get('position'):
+            pos = self.positions.get(request['position'])
+            if pos is None:
+                return self.result(TRADE_RETCODE_POSITION_CLOSED, request, 'Position closed')
+            ticket = self.next_ticket
+            self.close(pos, price, volume, request.get('comment', ''), tick.time)
+            return self.result(TRADE_RETCODE_DONE, request, 'Request executed', price, volume, ticket, ticket)
+
+        sl = float(request.get('sl') or 0.0)
+        tp = float(request.get('tp') or 0.0)
+        if not self.stops_ok(order_type, price, sl, tp):
+            return self.result(TRADE_RETCODE_INVALID_STOPS, request, 'Invalid stops')
+        ticket = self.next_ticket
+        self.next_ticket += 1
+        self.positions[ticket] = SimpleNamespace(
+            ticket=ticket, identifier=ticket, symbol=self.symbol, type=order_type, volume=volume,
+            price_open=price, price_current=price, sl=sl, tp=tp, profit=0.0, swap=0.0,
+            magic=request.get('magic', 0), comment=request.get('comment', ''), time=tick.time,
+            time_msc=tick.time_msc)
+        self.deals.append(SimpleNamespace(ticket=ticket, position_id=ticket, time=tick.time, type=order_type,
+                                          volume=volume, price=price, profit=0.0, symbol=self.symbol,
+                                          magic=request.get('magic', 0), comment=request.get('comment', ''),
+                                          entry=0))
+        return self.result(TRADE_RETCODE_DONE, request, 'Request executed', price, volume, ticket, ticket)
+
+    def stops_ok(self, order_type, price, sl, tp):
+        if order_type == ORDER_TYPE_BUY:
+            return (not sl or sl < price) and (not tp or tp > price)
+        return (not sl or sl > price) and (not tp or tp < price)
+
+    def equity(self):
+        return self.balance + sum(p.profit for p in self.positions.values())
+
+
+def _aggregate(m1, period):
+    if len(m1) == 0:
+        return m1
+    buckets = m1['time'] // period * period
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    out = np.zeros(len(starts), RATES_DTYPE)
+    out['time'] = buckets[starts]
+    out['open'] = m1['open'][starts]
+    out['close'] = m1['close'][np.r_[starts[1:], len(m1)] - 1]
+    out['high'] = np.maximum.reduceat(m1['high'], starts)
+    out['low'] = np.minimum.reduceat(m1['low'], starts)
+    out['tick_volume'] = np.add.reduceat(m1['tick_volume'], starts)
+    out['real_volume'] = np.add.reduceat(m1['real_volume'], starts)
+    out['spread'] = m1['spread'][starts]
+    return out
+
+
+_config = {}
+_sim = None
+_lock = threading.RLock()  # یک فراخوانی API در هر لحظه، مثل ترمینال واقعی
+
+
+def _locked(fn):
+    @wraps(fn)
+    def call(*args, **kwargs):
+        with _lock:
+            return fn(*args, **kwargs)
+    return call
+
+
+def configure(**settings):
+    """Override MT5_SIM_* settings (bars, ticks, symbol, start, speed, balance, fillings) before initialize()."""
+    _config.update(settings)
+
+
+def _setting(name, default):
+    if name in _config:
+        return _config[name]
+    return os.environ.get('MT5_SIM_' + name.upper(), default)
+
+
+# ---------- Replay clock ----------
+_patched = []
+
+
+def start():
+    """Replace time.time/monotonic/sleep by the replay clock (initializes the simulator)."""
+    initialize()
+    if not _patched:
+        _patched.append((_time.time, _time.monotonic, _time.sleep))
+        _time.time = _time.monotonic = _clock.time
+        _time.sleep = _clock.sleep
+
+
+def stop():
+    """Restore the real time.time/monotonic/sleep."""
+    if _patched:
+        _time.time, _time.monotonic, _time.sleep = _patched.pop()
+
+
+@contextmanager
+def replay():
+    start()
+    try:
+        yield
+    finally:
+        stop()
+
+
+def advance(seconds):
+    """Move the replay clock forward (virtual mode); raises ReplayFinished past the data."""
+    initialize()
+    _clock.sleep(seconds)
+
+
+# ---------- MetaTrader5 API ----------
+@_locked
+def initialize(*args, **kwargs):
+    global _sim
+    if _sim is None:
+        bars = _setting('bars', None)
+        bars = bars if isinstance(bars, np.ndarray) else _load_bars(bars)
+        ticks = _setting('ticks', None)
+        if isinstance(ticks, str):
+            ticks = np.load(ticks)
+        fillings = _setting('fillings', 'IOC,FOK')
+        _sim = _Sim(
+            symbol=_setting('symbol', 'EURUSD'),
+            bars=bars.astype(RATES_DTYPE),
+            ticks=ticks,
+            start=int(_setting('start', 1000)),
+            speed=float(_setting('speed', 0)),
+            balance=float(_setting('balance', 1000)),
+            fillings=fillings.split(',') if isinstance(fillings, str) else fillings,
+        )
+    return True
+
+
+def shutdown():
+    return True
+
+
+def version():
+    return (500, 0, 'mt5-sim')
+
+
+def last_error():
+    return _sim.last_error if _sim else (RES_S_OK, 'Success')
+
+
+def terminal_info():
+    if _sim is None:
+        return None
+    return SimpleNamespace(connected=True, trade_allowed=True, name='MT5-SIM', company='mt5_sim', ping_last=0)
+
+
+@_locked
+def account_info():
+    if _sim is None:
+        return None
+    _sim.process()
+    equity = _sim.equity()
+    return SimpleNamespace(login=1, balance=round(_sim.balance, 2), equity=round(equity, 2), profit=round(equity - _sim.balance, 2),
+                           margin=0.0, margin_free=round(equity, 2), margin_level=0.0, leverage=100, currency='USD',
+                           trade_allowed=True, trade_expert=True, server='MT5-SIM', name='simulator')
+
+
+@_locked
+def symbol_info(symbol):
+    if _sim is None or symbol != _sim.symbol:
+        return None
+    tick = _sim.tick()
+    spread = int(round((tick.ask - tick.bid) / _sim.point)) if tick else 0
+    return SimpleNamespace(
+        name=symbol, visible=True, select=True, digits=_sim.digits, point=_sim.point, spread=spread,
+        trade_tick_size=_sim.point, trade_tick_value=_sim.point * _sim.contract_size,
+        trade_contract_size=_sim.contract_size, volume_min=0.01, volume_max=100.0, volume_step=0.01,
+        trade_stops_level=0, trade_freeze_level=0, trade_mode=SYMBOL_TRADE_MODE_FULL,
+        filling_mode=SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC,
+        bid=tick.bid if tick else 0.0, ask=tick.ask if tick else 0.0)
+
+
+def symbol_select(symbol, enable=True):
+    return _sim is not None and symbol == _sim.symbol
+
+
+@_locked
+def symbol_info_tick(symbol):
+    if _sim is None or symbol != _sim.symbol:
+        return None
+    return _sim.tick()
+
+
+@_locked
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    if _sim is None or symbol != _sim.symbol:
+        return None
+    _sim.process()
+    return _sim.rates(timeframe, int(start_pos), int(count))
+
+
+@_locked
+def positions_get(symbol=None, ticket=None, group=None):
+    if _sim is None:
+        return None
+    _sim.process()
+    return tuple(p for p in _sim.positions.values()
+                 if (symbol is None or p.symbol == symbol) and (ticket is None or p.ticket == ticket))
+
+
+def positions_total():
+    return len(positions_get() or ())
+
+
+def orders_get(*args, **kwargs):
+    return ()
+
+
+@_locked
+def history_deals_get(*args, **kwargs):
+    return tuple(_sim.deals) if _sim else None
+
+
+@_locked
+def order_check(request):
+    if _sim is None:
+        return None
+    equity = _sim.equity()
+    return SimpleNamespace(retcode=0, balance=_sim.balance, equity=equity, profit=0.0, margin=0.0,
+                           margin_free=equity, margin_level=0.0, comment='Done', request=request)
+
+
+@_locked
+def order_send(request):
+    if _sim is None:
+        return None
+    return _sim.send(dict(request))
@@ -0,0 +1,21 @@
+"""
+Replay the bot against the simulator:
+
+    PYTHONPATH=mt5_sim python -m MetaTrader5 [module:function]
+
+The target defaults to main_metatrader_new:main. The replay clock is
+installed before the target module is imported.
+"""
+
+import importlib
+import sys
+
+import MetaTrader5 as mt5
+
+target = sys.argv[1] if len(sys.argv) > 1 else 'main_metatrader_new:main'
+module, _, func = target.partition(':')
+with mt5.replay():
+    try:
+        getattr(importlib.import_module(module), func or 'main')()
+    except mt5.ReplayFinished:
+        print("🏁 Replay finished")
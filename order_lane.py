@@ -0,0 +1,161 @@
+import functools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import MetaTrader5 as mt5
+
+# اتصال/قطع و ارسال سفارش از هر دو thread پشت همین قفل، یکی‌یکی
+MT5_LOCK = threading.RLock()
+
+# فراخوانی‌هایی که وضعیت ترمینال را عوض می‌کنند؛ خواندن‌ها (تیک، پوزیشن، کندل، حساب) قفل نمی‌گیرند
+SERIALIZED_CALLS = ('initialize', 'login', 'shutdown', 'symbol_select', 'order_check', 'order_send')
+
+
+def guard_mt5():
+    """
+    Wrap the state-changing MetaTrader5 functions (SERIALIZED_CALLS) with
+    MT5_LOCK, so a reconnect on the main loop never overlaps an order_send
+    on the order lane. Read-only calls stay unlocked: the main loop keeps
+    reading ticks, positions and rates while an order is at the broker.
+    """
+    if getattr(mt5, '_mt5_lock_guard', False):
+        return
+    for name in SERIALIZED_CALLS:
+        fn = getattr(mt5, name, None)
+        if fn is None:
+            continue
+
+        @functools.wraps(fn)
+        def locked(*args, _fn=fn, **kwargs):
+            with MT5_LOCK:
+                return _fn(*args, **kwargs)
+        setattr(mt5, name, locked)
+    mt5._mt5_lock_guard = True
+
+
+class OrderLane:
+    """
+    Order-execution lane: every trading call of the bot (open, SL/TP
+    modify, close all) runs on one worker thread, in submission order, so
+    the strategy loop never waits for filling-mode retries, broker round
+    trips or the CSV trade logging done around them.
+
+    submit() queues an intent and returns a concurrent.futures.Future. The
+    worker only makes the call; its outcome is posted back and applied by
+    poll() on the main thread at the top of each cycle: the cycle snapshot's
+    positions/account are invalidated, the latency line is printed and the
+    optional callback(result) runs (result is None if the call raised).
+    Only then does the intent leave pending(), so position checks treat an
+    in-flight open as an open position until the fresh positions are read.
+    Bot state is therefore only touched by the main thread.
+
+    With asynchronous=True guard_mt5() serializes connect/disconnect and
+    order calls across both threads; reads are not locked, so the main loop
+    does not stall while an order_send is at the broker. mt5.last_error()
+    after an order is diagnostic only, a main-loop read may reset it.
+
+    Per order the time spent queued and the time inside the broker call
+    are kept in `latencies` (ms).
+
+    With asynchronous=False the call runs inline and is applied at once, and
+    the returned Future is already done, so callers use one code path either
+    way.
+    """
+
+    def __init__(self, connector, asynchronous=True, history=200):
+        self.connector = connector
+        self.asynchronous = asynchronous
+        self._executor = None
+        if asynchronous:
+            guard_mt5()
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-lane')
+        self._lock = threading.Lock()
+        self._inflight = {}  # id -> (kind, direction)
+        self._next_id = 0
+        self._done = queue.Queue()  # نتایج worker، برای اعمال روی thread اصلی
+        self.latencies = deque(maxlen=history)
+
+    # ---------- Queue ----------
+    def submit(self, kind, fn, *args, direction=None, callback=None, **kwargs) -> Future:
+        queued = time.perf_counter()
+        with self._lock:
+            intent_id = self._next_id
+            self._next_id += 1
+            self._inflight[intent_id] = (kind, direction)
+
+        def run():
+            started = time.perf_counter()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                print(f"❌ [order_lane] {kind} failed: {e}")
+            finished = time.perf_counter()
+            record = {
+                'kind': kind,
+                'direction': direction,
+                'wait_ms': (started - queued) * 1000,
+                'exec_ms': (finished - started) * 1000,
+                'retcode': getattr(result, 'retcode', None),
+            }
+            self._done.put((intent_id, record, callback, result))
+            return result
+
+        if self._executor is not None:
+            return self._executor.submit(run)
+        future = Future()
+        future.set_result(run())
+        self.poll()
+        return future
+
+    def poll(self):
+        """Apply finished intents on the calling (main) thread; returns how many were applied."""
+        applied = 0
+        while True:
+            try:
+                intent_id, record, callback, result = self._done.get_nowait()
+            except queue.Empty:
+                return applied
+            applied += 1
+            snapshot = getattr(self.connector, 'snapshot', None)
+            if snapshot is not None:
+                snapshot.invalidate('positions', 'account')
+            self.latencies.append(record)
+            kind, direction = record['kind'], record['direction']
+            label = f"{kind} {direction}" if direction else kind
+            print(f"⏱️ [order_lane] {label} queued {record['wait_ms']:.1f}ms "
+                  f"broker {record['exec_ms']:.1f}ms retcode={record['retcode']}")
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception as e:
+                    print(f"❌ [order_lane] {kind} callback failed: {e}")
+            with self._lock:
+                self._inflight.pop(intent_id, None)
+
+    def pending(self, kind=None, direction=None):
+        """Number of intents not yet applied by poll(), optionally of one kind/direction."""
+        with self._lock:
+            return sum(1 for k, d in self._inflight.values()
+                       if (kind is None or k == kind) and (direction is None or d == direction))
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        self.poll()
+
+    # ---------- Trading intents ----------
+    def open_position(self, direction, callback=None, **kwargs) -> Future:
+        """direction 'buy'/'sell'; kwargs as for MT5Connector.open_buy_position."""
+        fn = self.connector.open_buy_position if direction == 'buy' else self.connector.open_sell_position
+        return self.submit('open', fn, direction=direction, callback=callback, **kwargs)
+
+    def modify_sl_tp(self, ticket, new_sl=None, new_tp=None, callback=None) -> Future:
+        return self.submit('modify', self.connector.modify_sl_tp, ticket, new_sl=new_sl, new_tp=new_tp,
+                           callback=callback)
+
+    def close_all(self, callback=None) -> Future:
+        return self.submit('close_all', self.connector.close_all_positions, callback=callback)
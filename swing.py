@@ -1,4 +1,7 @@
+from collections import OrderedDict
+
 from colorama import Fore
+import numpy as np
 
 
 def get_swing_points(data, legs):
@@ -11,24 +14,8 @@ def get_swing_points(data, legs):
         if legs[1]['end_value'] > legs[0]['start_value'] and legs[0]['end_value'] > legs[1]['end_value']:
             
             ### Chek true swing ###
-            s_index = data.index.tolist().index(legs[1]['start'])
-            e_index = data.index.tolist().index(legs[1]['end'])
-            true_candles = 0
-            first_candle = False
-
-            for k in range(s_index, e_index+1):  # Check the current poolback for have 3 bearish candles
-                
-                if data.iloc[k]['status'] == 'bearish':   # If current candle is bearish for check swing
-                    
-                    if first_candle:  # If first candle of poolback
-                        if data.iloc[k]['close'] < last_candle_close:  # If last close is less than current candle close
-                            true_candles += 1
-                            last_candle_close = data.iloc[k]['close']
-                            
-                    else:  # If not first candle of poolback give value
-                        last_candle_close = data.iloc[k]['close']
-                    
-                    first_candle = True
+            s_index, e_index = _leg_bounds(data, legs[1])
+            true_candles = pullback_strength(np.asarray(data['close']), _bar_status(data), s_index, e_index, 'bullish')
             
             if true_candles >= 3:
                 swing_type = 'bullish'
@@ -38,27 +25,169 @@ def get_swing_points(data, legs):
         elif legs[1]['end_value'] < legs[0]['start_value'] and legs[0]['end_value'] < legs[1]['end_value']:
 
             ### Chek true swing ###
-            s_index = data.index.tolist().index(legs[1]['start'])
-            e_index = data.index.tolist().index(legs[1]['end'])
-            true_candles = 0
-            first_candle = False
-
-            for k in range(s_index, e_index+1):  # Check the current poolback for have 3 bullish candles
-                
-                if data.iloc[k]['status'] == 'bullish':   # If current candle is bullish for check swing
-                    
-                    if first_candle:  # If first candle of poolback
-                        if data.iloc[k]['close'] > last_candle_close:  # If last close is more than current candle close
-                            true_candles += 1
-                            last_candle_close = data.iloc[k]['close']
-                            
-                    else:  # If not first candle of poolback give value
-                        last_candle_close = data.iloc[k]['close']
-                    
-                    first_candle = True
+            s_index, e_index = _leg_bounds(data, legs[1])
+            true_candles = pullback_strength(np.asarray(data['close']), _bar_status(data), s_index, e_index, 'bearish')
                 
             if true_candles >= 3:
                 swing_type = 'bearish'
                 is_swing = True
 
-        return swing_type, is_swing
\ No newline at end of file
+        return swing_type, is_swing
+
+
+class SwingCache:
+    """
+    Memoizes get_swing_points per leg triple so repeated checks of an unchanged
+    legs[-3:] (same bar, or the forced-processing path) skip the DataFrame.
+
+    The key holds the timestamps and prices of legs[0] and legs[1]: only those
+    enter the classification (the pullback range lies in legs[1], whose bars
+    are all closed), so a still-growing legs[2] keeps hitting the cache.
+    Timestamps rather than positions are used because positions shift as the
+    window rolls.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get_swing_points(self, data, legs):
+        if len(legs) != 3:
+            return get_swing_points(data, legs)
+        key = tuple((leg['start'], leg['end'], leg['start_value'], leg['end_value']) for leg in legs[:2])
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = get_swing_points(data, legs)
+        self._entries[key] = result
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+swing_cache = SwingCache()
+
+
+# One row per detected swing: index k of the leg triple legs[k:k+3], 1=bullish / -1=bearish,
+# pullback confirmations and the bar where the triple ends (end of its third leg)
+SWING_EVENT_DTYPE = np.dtype([
+    ('triple', np.int64),
+    ('type', np.int8),
+    ('confirmations', np.int64),
+    ('bar_pos', np.int64),
+])
+
+
+def scan_swings(legs, close, status, min_confirmations=3):
+    """
+    Batch get_swing_points over every leg triple of a leg history.
+
+    legs is a list of legs carrying start_pos/end_pos (get_legs output) or a
+    LEG_DTYPE array; close/status are the bar arrays the legs were built on.
+    The triple geometry is checked with array masks and the pullback counts of
+    all candidate triples are computed in one segmented running-min pass, so
+    the result equals sliding get_swing_points over legs[k:k+3] for every k.
+    """
+    if not isinstance(legs, np.ndarray):
+        legs = np.array([(leg['start_pos'], leg['end_pos'], leg['start_value'], leg['end_value'])
+                         for leg in legs],
+                        dtype=[('start_pos', np.int64), ('end_pos', np.int64),
+                               ('start_value', np.float64), ('end_value', np.float64)]).reshape(-1)
+    if len(legs) < 3:
+        return np.empty(0, dtype=SWING_EVENT_DTYPE)
+
+    l0, l1, l2 = legs[:-2], legs[1:-1], legs[2:]
+    up = (l1['end_value'] > l0['start_value']) & (l0['end_value'] > l1['end_value'])
+    down = ~up & (l1['end_value'] < l0['start_value']) & (l0['end_value'] < l1['end_value'])
+    triples = np.flatnonzero(up | down)
+    is_up = up[triples]
+    starts = l1['start_pos'][triples]
+    ends = l1['end_pos'][triples]
+
+    # همه کندل‌های پولبک کاندیداها پشت سر هم، با شماره بخش (seg) برای هر کاندیدا
+    sizes = ends - starts + 1
+    seg = np.repeat(np.arange(len(triples)), sizes)
+    bars = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes) + np.repeat(starts, sizes)
+
+    status = np.asarray(status)
+    bearish = status if status.dtype == bool else status == 'bearish'
+    target = bearish[bars] == is_up[seg]
+    bars, seg = bars[target], seg[target]
+
+    # رتبه صحیح close ها تا مقایسه‌ها دقیق بمانند؛ برای سوئینگ نزولی علامت برعکس (max → min)
+    _, ranks = np.unique(np.asarray(close, dtype=np.float64)[bars], return_inverse=True)
+    ranks = ranks.astype(np.int64)
+    span = 2 * (int(ranks.max()) + 1) + 1 if len(ranks) else 1
+    key = np.where(is_up[seg], ranks, -ranks) - seg * span
+    running = np.minimum.accumulate(key)
+    first = np.ones(len(seg), dtype=bool)
+    first[1:] = seg[1:] != seg[:-1]
+    counted = np.zeros(len(seg), dtype=bool)
+    counted[1:] = key[1:] < running[:-1]
+    counts = np.bincount(seg[counted & ~first], minlength=len(triples))
+
+    keep = counts >= min_confirmations
+    events = np.empty(int(keep.sum()), dtype=SWING_EVENT_DTYPE)
+    events['triple'] = triples[keep]
+    events['type'] = np.where(is_up[keep], 1, -1)
+    events['confirmations'] = counts[keep]
+    events['bar_pos'] = l2['end_pos'][triples[keep]]
+    return events
+
+
+def pullback_strength(close, status, s, e, swing_type):
+    """
+    Number of confirming pullback candles in bars [s, e] (inclusive).
+
+    For a bullish swing the pullback candles are the bearish ones: the first
+    sets the reference close and every later bearish close strictly below the
+    lowest one so far counts (mirror image with bullish candles / higher closes
+    for a bearish swing). status is the 'bullish'/'bearish' column or a boolean
+    "is bearish" array.
+    """
+    status = np.asarray(status[s:e + 1])
+    bearish = status if status.dtype == bool else status == 'bearish'
+    closes = np.asarray(close[s:e + 1], dtype=np.float64)
+    closes = closes[bearish] if swing_type == 'bullish' else closes[~bearish]
+    if len(closes) < 2:
+        return 0
+    if swing_type == 'bullish':
+        return int(np.count_nonzero(closes[1:] < np.minimum.accumulate(closes)[:-1]))
+    return int(np.count_nonzero(closes[1:] > np.maximum.accumulate(closes)[:-1]))
+
+
+def _bar_status(data):
+    """Boolean bearish array of a MarketWindow, or the status column of a DataFrame."""
+    if 'bearish' in data:
+        return data['bearish']
+    return data['status'].array
+
+
+def _leg_bounds(data, leg):
+    """
+    Bar positions of a leg's start/end in data. Positions stored on the leg are
+    used when they point at the leg's timestamps; otherwise the timestamps are
+    resolved with Index.get_indexer, whose hash table pandas builds once per
+    index object (i.e. once per data window) instead of a list scan per call.
+    """
+    index = data.index
+    s_index = leg.get('start_pos')
+    e_index = leg.get('end_pos')
+    if (s_index is not None and e_index is not None and 0 <= s_index <= e_index < len(index)
+            and index[s_index] == leg['start'] and index[e_index] == leg['end']):
+        return s_index, e_index
+    s_index, e_index = index.get_indexer([leg['start'], leg['end']]).tolist()
+    if s_index < 0 or e_index < 0:
+        raise ValueError(f"leg {leg['start']} -> {leg['end']} is not inside the data window")
+    return s_index, e_index
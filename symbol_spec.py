@@ -0,0 +1,94 @@
+import time
+
+import MetaTrader5 as mt5
+
+from metatrader5_config import MT5_CONFIG
+
+
+class SymbolSpec:
+    """
+    Static trading specification of one symbol, read from mt5.symbol_info.
+    pip_size is 10 points on 5/3-digit symbols, otherwise one point.
+    tick_size/tick_value prefer trade_tick_*, then tick_*, then point and
+    a contract-size estimate.
+    """
+
+    __slots__ = ('name', 'digits', 'point', 'pip_size', 'tick_size', 'tick_value', 'contract_size',
+                 'stops_level', 'freeze_level', 'volume_step', 'volume_min', 'volume_max',
+                 'filling_mode', 'visible', 'fetched_at')
+
+    def __init__(self, info, fetched_at=None):
+        self.name = getattr(info, 'name', None)
+        self.digits = info.digits
+        self.point = info.point
+        self.pip_size = info.point * (10.0 if info.digits in (3, 5) else 1.0)
+        tick_size = getattr(info, 'trade_tick_size', None) or getattr(info, 'tick_size', None) or info.point
+        tick_value = getattr(info, 'trade_tick_value', None) or getattr(info, 'tick_value', None)
+        self.contract_size = getattr(info, 'trade_contract_size', None)
+        if tick_value is None and self.contract_size and tick_size:
+            # تقریب: برای جفت‌ارزهای USD-quoted روی حساب دلاری دقیق است
+            tick_value = self.contract_size * tick_size
+        self.tick_size = tick_size
+        self.tick_value = tick_value
+        self.stops_level = getattr(info, 'trade_stops_level', 0) or 0
+        self.freeze_level = getattr(info, 'trade_freeze_level', 0) or 0
+        self.volume_step = getattr(info, 'volume_step', 0) or 0.01
+        self.volume_min = getattr(info, 'volume_min', 0) or self.volume_step
+        self.volume_max = getattr(info, 'volume_max', 0) or 100.0
+        self.filling_mode = getattr(info, 'filling_mode', 0)
+        self.visible = getattr(info, 'visible', True)
+        self.fetched_at = time.monotonic() if fetched_at is None else fetched_at
+
+    def round_price(self, price):
+        return float(f"{price:.{self.digits}f}")
+
+    def normalize_volume(self, vol):
+        steps = round(vol / self.volume_step)
+        return max(self.volume_min, min(self.volume_max, steps * self.volume_step))
+
+    def min_stop_distance(self):
+        """Broker stops level, at least 3 points."""
+        return max(self.stops_level * self.point, 3 * self.point)
+
+
+class SymbolSpecCache:
+    """
+    SymbolSpec per symbol, re-read from the terminal at most once per `ttl`
+    seconds instead of on every symbol_info call site (price rounding,
+    stop validation, volume sizing, pip size...). invalidate() forces the
+    next get() to re-read, e.g. after a reconnect or an order rejected for
+    stops/volume/filling, when the broker's specification may have changed.
+    A failed read is not cached.
+    """
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    def get(self, symbol, refresh=False):
+        """SymbolSpec for `symbol`, or None if the terminal has no info for it."""
+        spec = self._entries.get(symbol)
+        if spec is not None and not refresh and time.monotonic() - spec.fetched_at < self.ttl:
+            self.hits += 1
+            return spec
+        self.misses += 1
+        info = mt5.symbol_info(symbol)
+        if info is None:
+            self._entries.pop(symbol, None)
+            return None
+        spec = self._entries[symbol] = SymbolSpec(info)
+        return spec
+
+    def invalidate(self, symbol=None):
+        if symbol is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(symbol, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+symbol_specs = SymbolSpecCache(MT5_CONFIG.get('symbol_spec_ttl', 60.0))
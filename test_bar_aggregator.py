@@ -0,0 +1,149 @@
+"""
+تست BarAggregator: کندل‌های M15 ساخته‌شده از جریان M1 باید با کندل‌های
+مرجع (تجمیع مستقیم همه ردیف‌های M1) برابر باشند، حتی بعد از گسستگی بافر.
+بدون MetaTrader5 اجرا می‌شود:  python test_bar_aggregator.py  (یا pytest)
+"""
+
+import sys
+
+import numpy as np
+
+from bar_aggregator import BarAggregator
+from bar_store import RATES_DTYPE
+
+PERIOD = 900
+BUFFER = 200
+
+
+def make_m1(n=3000, seed=0, start=1_700_000_000, drop=0.03):
+    """M1 rates with a few silent minutes (no ticks -> no bar), like broker data."""
+    rng = np.random.default_rng(seed)
+    close = 1.08 + np.cumsum(rng.normal(0, 0.00015, n))
+    rates = np.zeros(n, RATES_DTYPE)
+    rates['time'] = start // 60 * 60 + np.arange(n) * 60
+    rates['open'] = np.r_[close[0], close[:-1]]
+    rates['close'] = close
+    rates['high'] = np.maximum(rates['open'], close) + np.abs(rng.normal(0, 0.0001, n))
+    rates['low'] = np.minimum(rates['open'], close) - np.abs(rng.normal(0, 0.0001, n))
+    rates['tick_volume'] = rng.integers(1, 50, n)
+    keep = rng.random(n) > drop
+    keep[0] = True
+    return rates[keep]
+
+
+def reference(m1, period=PERIOD):
+    """Higher-timeframe bars from all M1 rows, bucket by bucket."""
+    out = []
+    buckets = m1['time'] // period * period
+    for b in np.unique(buckets):
+        rows = m1[buckets == b]
+        bar = np.zeros((), RATES_DTYPE)
+        bar['time'] = b
+        bar['open'] = rows['open'][0]
+        bar['high'] = rows['high'].max()
+        bar['low'] = rows['low'].min()
+        bar['close'] = rows['close'][-1]
+        bar['tick_volume'] = rows['tick_volume'].sum()
+        out.append(bar)
+    return np.array(out, RATES_DTYPE)
+
+
+def broker_completed(m1, end):
+    """What copy_rates_from_pos(M15)[:-1] returns when the forming M1 bar is m1[end-1]."""
+    ref = reference(m1[:end])
+    return ref[:-1]
+
+
+def same_bars(a, b):
+    fields = ('time', 'open', 'high', 'low', 'close', 'tick_volume')
+    return len(a) == len(b) and all(np.array_equal(a[f], b[f]) for f in fields)
+
+
+def assert_matches_reference(agg, m1):
+    ref = reference(m1)
+    by_time = {int(t): i for i, t in enumerate(ref['time'])}
+    for bar in agg.bars:
+        assert int(bar['time']) in by_time, f"unknown bar {bar['time']}"
+        assert same_bars(bar[None], ref[by_time[int(bar['time'])]][None]), f"bar {bar['time']} differs"
+
+
+def stream(agg, m1, start, stop):
+    for end in range(start, stop):
+        agg.update(m1[max(0, end - BUFFER):end])
+
+
+def test_streaming_matches_reference():
+    m1 = make_m1()
+    agg = BarAggregator(PERIOD, history=64)
+    stream(agg, m1, 2, len(m1) + 1)
+    assert_matches_reference(agg, m1)
+    done = agg.completed(21)
+    assert done is not None
+    assert same_bars(done, broker_completed(m1, len(m1))[-21:])
+
+
+def test_reload_gap_merges_broker_bars():
+    m1 = make_m1(seed=1)
+    agg = BarAggregator(PERIOD, history=64)
+    stream(agg, m1, 2, 1000)
+    # بافر بعد از 400 دقیقه دوباره بارگذاری می‌شود: seed با کندل‌های بروکر و بعد update
+    end = 1400
+    agg.seed(broker_completed(m1, end)[-65:])
+    agg.update(m1[end - BUFFER:end])
+    stream(agg, m1, end + 1, end + 120)
+    assert_matches_reference(agg, m1)
+    done = agg.completed(21)
+    assert done is not None
+    assert same_bars(done, broker_completed(m1, end + 119)[-21:])
+
+
+def test_gap_without_seed_is_not_reported():
+    m1 = make_m1(seed=2, drop=0.0)
+    agg = BarAggregator(PERIOD, history=64)
+    stream(agg, m1, 2, 1000)
+    # بافر جدید از وسط یک کندل M15 شروع می‌شود و seed ندارد
+    end = 1000 + 400
+    first = end - BUFFER
+    while m1['time'][first] % PERIOD == 0:
+        first += 1
+    agg.update(m1[first:end])
+    stream(agg, m1, end + 1, end + 60)
+    assert_matches_reference(agg, m1)
+    hole = int(m1['time'][first]) // PERIOD * PERIOD
+    assert hole not in set(agg.bars['time'].tolist())
+    assert agg.completed(21) is None  # حفره داخل بازه: fallback به بروکر
+    assert agg.completed(1) is not None
+    # seed بروکر حفره را پر می‌کند
+    agg.seed(broker_completed(m1, end + 59)[-65:])
+    assert same_bars(agg.completed(21), broker_completed(m1, end + 59)[-21:])
+
+
+def test_stale_output_rejected():
+    m1 = make_m1(seed=3, drop=0.0)
+    agg = BarAggregator(PERIOD, history=64)
+    stream(agg, m1, 2, 600)
+    assert agg.completed(5) is not None
+    # بازار یک کندل M15 کامل ساکت بود: کندل قبلی در دسترس نیست
+    last = int(m1['time'][598])
+    forming = np.array(m1[598:599])
+    forming['time'] = (last // PERIOD + 2) * PERIOD
+    agg.update(np.concatenate([m1[400:599], forming]))
+    assert agg.completed(5) is None
+
+
+def run_all_tests():
+    tests = [test_streaming_matches_reference, test_reload_gap_merges_broker_bars,
+             test_gap_without_seed_is_not_reported, test_stale_output_rejected]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
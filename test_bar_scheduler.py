@@ -0,0 +1,116 @@
+"""
+تست BarScheduler: اگر اولین تیک کندل جدید دیرتر از boundary_timeout برسد، مرز
+در انتظار می‌ماند و همان تیک (نه مرز بعدی یا پردازش اجباری 60 ثانیه‌ای) دریافت
+کندل را فعال می‌کند.
+"""
+
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+import bar_scheduler
+from bar_scheduler import BarScheduler
+
+B0 = 1_700_000_040 // 60 * 60
+
+
+class Clock:
+    """Virtual time.time/time.sleep."""
+
+    def __init__(self, now):
+        self.now = float(now)
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0.0)
+
+
+class Terminal:
+    """symbol_info_tick over fixed tick times: the latest tick at or before now."""
+
+    def __init__(self, clock, tick_times):
+        self.clock = clock
+        self.tick_times = np.asarray(tick_times, dtype=float)
+
+    def symbol_info_tick(self, symbol):
+        k = np.searchsorted(self.tick_times, self.clock.now, side='right')
+        if k == 0:
+            return None
+        t = self.tick_times[k - 1]
+        return SimpleNamespace(time=int(t), time_msc=int(t * 1000))
+
+    def last_bar(self):
+        """Open time of the newest bar the broker has (a bar opens with its first tick)."""
+        tick = self.symbol_info_tick(None)
+        return tick.time // 60 * 60
+
+
+def run(tick_times, until):
+    """Main-loop stand-in: fetch on every report; returns {bar open: seconds until fetched} and empty fetches."""
+    clock = Clock(B0 - 30)
+    terminal = Terminal(clock, tick_times)
+    real = bar_scheduler.time, bar_scheduler.mt5.symbol_info_tick
+    bar_scheduler.time = SimpleNamespace(time=clock.time, sleep=clock.sleep)
+    bar_scheduler.mt5.symbol_info_tick = terminal.symbol_info_tick
+    try:
+        scheduler = BarScheduler('EURUSD')
+        delays, empty = {}, 0
+        last_bar = None
+        while clock.now < until:
+            if not scheduler.wait():
+                continue
+            bar = terminal.last_bar()
+            if bar != last_bar:
+                if last_bar is not None:
+                    delays[bar] = clock.now - bar
+                last_bar = bar
+                scheduler.bar_seen()
+            else:
+                empty += 1
+        return delays, empty
+    finally:
+        bar_scheduler.time, bar_scheduler.mt5.symbol_info_tick = real
+
+
+def test_regular_ticks():
+    delays, empty = run(np.arange(B0 - 30, B0 + 300, 1.0), B0 + 290)
+    assert sorted(delays) == [B0 + 60 * k for k in range(1, 5)]
+    assert max(delays.values()) < 0.2 and empty == 0
+
+
+def test_delayed_first_tick():
+    ticks = np.arange(B0 - 30, B0 + 300, 1.0)
+    ticks = ticks[(ticks < B0 + 60) | (ticks >= B0 + 70)]  # 10 ثانیه بدون تیک بعد از مرز
+    delays, empty = run(ticks, B0 + 290)
+    assert sorted(delays) == [B0 + 60 * k for k in range(1, 5)]
+    assert 10 <= delays[B0 + 60] < 10.7, delays[B0 + 60]
+    assert max(d for bar, d in delays.items() if bar != B0 + 60) < 0.2
+    assert empty == 1  # فقط دریافت بعد از timeout
+
+
+def test_gap_past_next_boundary():
+    ticks = np.arange(B0 - 30, B0 + 300, 1.0)
+    ticks = ticks[(ticks < B0 + 60) | (ticks >= B0 + 135)]  # کندل‌های B0+60 و B0+120 بدون تیک
+    delays, empty = run(ticks, B0 + 290)
+    assert B0 + 60 not in delays
+    assert 15 <= delays[B0 + 120] < 15.7, delays[B0 + 120]
+
+
+def run_all_tests():
+    tests = [test_regular_ticks, test_delayed_first_tick, test_gap_past_next_boundary]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
@@ -0,0 +1,117 @@
+"""
+تست BarStore: فایل با رکورد ناقص (قطع برق وسط append) اصلاح می‌شود و شروع گرم
+فقط وقتی به فایل اضافه می‌کند که کندل‌های بروکر به آخرین کندل ذخیره‌شده برسند.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import MetaTrader5 as mt5
+
+import mt5_connector
+from bar_store import RATES_DTYPE, BarSeries, BarStore
+
+T0 = 1_700_000_040
+
+
+def make_rates(start, n):
+    rates = np.zeros(n, RATES_DTYPE)
+    rates['time'] = T0 + (start + np.arange(n)) * 60
+    rates['close'] = 1.08 + (start + np.arange(n)) * 1e-5
+    rates['open'] = rates['high'] = rates['low'] = rates['close']
+    rates['tick_volume'] = 1
+    return rates
+
+
+def broker(rates):
+    """copy_rates_from_pos over a fixed history: last row is the forming bar."""
+    def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+        return rates[max(len(rates) - count, 0):].copy()
+    return copy_rates_from_pos
+
+
+def connector(root):
+    conn = mt5_connector.MT5Connector()
+    conn.bar_store = BarStore(root)
+    return conn
+
+
+def warm_start(conn, history, count, **kwargs):
+    real = mt5_connector.mt5.copy_rates_from_pos
+    mt5_connector.mt5.copy_rates_from_pos = broker(history)
+    try:
+        return conn._warm_start(mt5.TIMEFRAME_M1, count, **kwargs)
+    finally:
+        mt5_connector.mt5.copy_rates_from_pos = real
+
+
+def test_torn_record_truncated():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'EURUSD_M1.bars')
+        with open(path, 'wb') as fh:
+            fh.write(make_rates(0, 10).tobytes())
+            fh.write(make_rates(10, 1).tobytes()[:17])  # append نیمه‌کاره
+        series = BarSeries(path)
+        assert len(series) == 10
+        assert os.path.getsize(path) == 10 * RATES_DTYPE.itemsize
+        assert series.append(make_rates(8, 5)) == 3
+        bars = BarSeries(path).bars()
+        assert np.array_equal(bars['time'], make_rates(0, 13)['time'])
+
+
+def test_warm_start_fills_gap():
+    with tempfile.TemporaryDirectory() as root:
+        history = make_rates(0, 400)
+        conn = connector(root)
+        series = conn.bar_store.series(conn.symbol, mt5.TIMEFRAME_M1)
+        series.append(history[:300])
+        rates = warm_start(conn, history, 200)
+        assert np.array_equal(rates['time'], history['time'][-200:])
+        assert np.array_equal(series.bars()['time'], history['time'][:-1])
+
+
+def test_warm_start_gap_not_appended():
+    with tempfile.TemporaryDirectory() as root:
+        stored = make_rates(0, 100)
+        history = make_rates(500, 300)  # بروکر فقط از دقیقه 500 به بعد را دارد
+        conn = connector(root)
+        series = conn.bar_store.series(conn.symbol, mt5.TIMEFRAME_M1)
+        series.append(stored)
+        assert warm_start(conn, history, 200, max_fill=1000) is None
+        assert len(series) == 0
+        old = BarSeries(str(series.path) + '.old').bars()
+        assert np.array_equal(old['time'], stored['time'])
+        # دانلود کامل بعدی فایل را از نو و بدون حفره می‌سازد
+        series.append(history[:-1])
+        assert np.array_equal(series.bars()['time'], history['time'][:-1])
+
+
+def test_warm_start_max_fill_not_appended():
+    with tempfile.TemporaryDirectory() as root:
+        history = make_rates(0, 400)
+        conn = connector(root)
+        series = conn.bar_store.series(conn.symbol, mt5.TIMEFRAME_M1)
+        series.append(history[:50])
+        assert warm_start(conn, history, 200, max_fill=100) is None
+        assert len(series) == 0
+
+
+def run_all_tests():
+    tests = [test_torn_record_truncated, test_warm_start_fills_gap, test_warm_start_gap_not_appended,
+             test_warm_start_max_fill_not_appended]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
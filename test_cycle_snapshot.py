@@ -0,0 +1,128 @@
+"""
+تست CycleSnapshot: هر آیتم در هر سیکل یک بار خوانده می‌شود، invalidate خواندن
+دوباره را اجبار می‌کند و مقداری که حین invalidate خوانده شده نگه داشته نمی‌شود.
+"""
+
+import sys
+import threading
+from types import SimpleNamespace
+
+import MetaTrader5 as mt5
+
+from cycle_snapshot import CycleSnapshot
+
+
+class FakeSnapshot(CycleSnapshot):
+    """Snapshot over a scripted terminal: positions come from self.open."""
+
+    def __init__(self):
+        super().__init__('EURUSD')
+        self.open = []
+        self.during_fetch = None
+
+    def _fetch(self, name):
+        self.fetches += 1
+        if self.during_fetch is not None:
+            self.during_fetch()
+        if name == 'positions':
+            return tuple(self.open)
+        return SimpleNamespace(name=name, n=self.fetches)
+
+
+def position(ticket, position_type):
+    return SimpleNamespace(ticket=ticket, type=position_type)
+
+
+def test_fetch_once_per_cycle():
+    snap = FakeSnapshot()
+    snap.begin()
+    first = snap.account
+    assert snap.account is first and snap.positions == ()
+    assert snap.fetches == 2
+    snap.begin()
+    assert snap.account is not first
+    assert snap.fetches == 3
+
+
+def test_begin_keeps_given_tick():
+    snap = FakeSnapshot()
+    tick = SimpleNamespace(bid=1.1, ask=1.1001)
+    snap.begin(tick)
+    assert snap.tick is tick and snap.fetches == 0
+    assert snap.refresh('tick') is not tick and snap.fetches == 1
+
+
+def test_inactive_reads_live():
+    snap = FakeSnapshot()
+    snap.account
+    snap.account
+    assert snap.fetches == 2
+
+
+def test_invalidate_refetches_positions():
+    snap = FakeSnapshot()
+    snap.begin()
+    assert not snap.has_positions()
+    snap.open.append(position(7, mt5.POSITION_TYPE_BUY))
+    assert not snap.has_positions()  # هنوز همان سیکل
+    snap.invalidate('positions')
+    assert snap.has_positions()
+    assert snap.position(7).type == mt5.POSITION_TYPE_BUY
+    assert snap.has_conflicting('sell') and not snap.has_conflicting('buy')
+    assert snap.positions_of(mt5.POSITION_TYPE_SELL) == []
+
+
+def test_value_fetched_across_invalidate_not_kept():
+    snap = FakeSnapshot()
+    snap.begin()
+    # thread سفارش حین خواندن positions آن را باطل می‌کند
+    snap.during_fetch = lambda: snap.invalidate('positions')
+    assert snap.positions == ()
+    snap.during_fetch = None
+    snap.open.append(position(1, mt5.POSITION_TYPE_SELL))
+    assert snap.has_positions()
+    assert snap.fetches == 2
+
+
+def test_concurrent_invalidate():
+    snap = FakeSnapshot()
+    snap.open.append(position(1, mt5.POSITION_TYPE_BUY))
+    snap.begin()
+    stop = threading.Event()
+    errors = []
+
+    def invalidate():
+        while not stop.is_set():
+            snap.invalidate('positions', 'account')
+
+    worker = threading.Thread(target=invalidate)
+    worker.start()
+    try:
+        for _ in range(20000):
+            assert snap.has_positions()
+            assert snap.account is not None
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        worker.join()
+    assert not errors, errors
+
+
+def run_all_tests():
+    tests = [test_fetch_once_per_cycle, test_begin_keeps_given_tick, test_inactive_reads_live,
+             test_invalidate_refetches_positions, test_value_fetched_across_invalidate_not_kept,
+             test_concurrent_invalidate]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
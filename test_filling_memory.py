@@ -0,0 +1,127 @@
+"""
+تست FillingModeMemory و try_all_filling_modes: مد filling پذیرفته‌شده برای هر
+بروکر/نماد روی دیسک می‌ماند و سفارش بعدی (حتی بعد از ری‌استارت) با یک ارسال
+انجام می‌شود.
+"""
+
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import MetaTrader5 as mt5
+
+import mt5_connector
+from filling_memory import AUTO, FillingModeMemory
+from metatrader5_config import MT5_CONFIG
+from symbol_spec import symbol_specs
+
+
+class Broker:
+    """order_send that only accepts `accepted` as type_filling."""
+
+    def __init__(self, accepted, reject_retcode=None):
+        self.accepted = accepted
+        self.reject_retcode = reject_retcode
+        self.sent = []
+
+    def order_send(self, request):
+        mode = request.get('type_filling', AUTO)
+        self.sent.append(mode)
+        if mode != self.accepted:
+            return SimpleNamespace(retcode=mt5.TRADE_RETCODE_INVALID_FILL, comment='Unsupported filling mode')
+        if self.reject_retcode:
+            return SimpleNamespace(retcode=self.reject_retcode, comment='Invalid stops')
+        return SimpleNamespace(retcode=mt5_connector.RET_OK, comment='Done', order=1)
+
+    def symbol_info(self, symbol):
+        return SimpleNamespace(name=symbol, digits=5, point=0.00001, trade_tick_size=0.00001,
+                               trade_tick_value=1.0, trade_contract_size=100000, filling_mode=0, visible=True)
+
+
+def send(broker, path, broker_name='Broker-1'):
+    """One market order through a fresh connector; returns (result, sends it took)."""
+    names = ('order_send', 'symbol_info', 'terminal_info', 'last_error')
+    real = {name: getattr(mt5, name) for name in names}
+    mt5.order_send = broker.order_send
+    mt5.symbol_info = broker.symbol_info
+    mt5.terminal_info = lambda: SimpleNamespace(connected=True)
+    mt5.last_error = lambda: (1, 'Success')
+    symbol_specs.invalidate()
+    try:
+        conn = mt5_connector.MT5Connector()
+        conn.filling_memory = FillingModeMemory(path)
+        conn.broker = broker_name
+        before = len(broker.sent)
+        res = conn.try_all_filling_modes({'action': 1, 'symbol': conn.symbol, 'volume': 0.1, 'type': 0})
+        return res, len(broker.sent) - before
+    finally:
+        for name, fn in real.items():
+            setattr(mt5, name, fn)
+        symbol_specs.invalidate()
+
+
+def test_memory_persists():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'filling_modes.json')
+        memory = FillingModeMemory(path)
+        assert memory.get('B', 'EURUSD') is None
+        memory.remember('B', 'EURUSD', mt5.ORDER_FILLING_FOK)
+        memory.remember(None, 'EURUSD', AUTO)
+        reloaded = FillingModeMemory(path)
+        assert reloaded.get('B', 'EURUSD') == mt5.ORDER_FILLING_FOK
+        assert reloaded.get(None, 'EURUSD') == AUTO
+        assert reloaded.get('B', 'GBPUSD') is None
+
+
+def test_unreadable_file_ignored():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'filling_modes.json')
+        with open(path, 'w') as fh:
+            fh.write('{broken')
+        memory = FillingModeMemory(path)
+        assert memory.get('B', 'EURUSD') is None
+        memory.remember('B', 'EURUSD', mt5.ORDER_FILLING_IOC)
+        assert FillingModeMemory(path).get('B', 'EURUSD') == mt5.ORDER_FILLING_IOC
+
+
+def test_learned_mode_sent_first():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'filling_modes.json')
+        broker = Broker(mt5.ORDER_FILLING_RETURN)
+        res, sends = send(broker, path)
+        assert res.retcode == mt5_connector.RET_OK and sends > 1
+        res, sends = send(broker, path)  # connector تازه = ری‌استارت ربات
+        assert res.retcode == mt5_connector.RET_OK and sends == 1
+        assert broker.sent[-1] == mt5.ORDER_FILLING_RETURN
+        # بروکر دیگر حافظه جدا دارد
+        _, sends = send(broker, path, broker_name='Broker-2')
+        assert sends > 1
+
+
+def test_other_rejection_not_retried():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'filling_modes.json')
+        broker = Broker(mt5.ORDER_FILLING_RETURN, reject_retcode=10016)
+        res, sends = send(broker, path)
+        assert res.retcode == 10016
+        assert broker.sent[-1] == mt5.ORDER_FILLING_RETURN  # بعد از رد غیر filling تلاش دیگری نیست
+        assert FillingModeMemory(path).get('Broker-1', MT5_CONFIG['symbol']) is None
+
+
+def run_all_tests():
+    tests = [test_memory_persists, test_unreadable_file_ignored, test_learned_mode_sent_first,
+             test_other_rejection_not_retried]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
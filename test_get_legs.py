@@ -0,0 +1,262 @@
+"""
+تست هم‌ارزی تشخیص لگ و سوئینگ با نسخه اولیه ربات: get_legs، هسته آرایه‌ای،
+LegTracker، get_legs_arrays_2d، get_swing_points و scan_swings باید همان نتیجه
+پیاده‌سازی مرجع (کپی کد اولیه pandas در همین فایل) را بدهند.
+بدون MetaTrader5 اجرا می‌شود:  python test_get_legs.py  (یا pytest)
+"""
+
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from get_legs import (LegTracker, get_legs, get_legs_arrays, get_legs_arrays_2d, get_legs_arrays_multi,
+                      legs_to_array)
+from swing import get_swing_points, scan_swings
+
+THRESHOLDS = (3, 6, 10)
+SEEDS = range(6)
+
+
+# ---------- Reference (original pandas implementation) ----------
+def reference_legs(data, threshold):
+    legs = []
+    start_index = data.index[0]
+    j = 0
+    i = 1
+    while i < len(data):
+        current_is_bullish = data['close'].iloc[i] >= data['open'].iloc[i]
+        if j > 0 and legs[j-1]['direction'] == 'up' and data['high'].iloc[i] >= data['high'].iloc[i-1]:
+            current_price = data['high'].iloc[i]
+        elif j > 0 and legs[j-1]['direction'] == 'down' and data['low'].iloc[i] <= data['low'].iloc[i-1]:
+            current_price = data['low'].iloc[i]
+        else:
+            current_price = data['high'].iloc[i] if current_is_bullish else data['low'].iloc[i]
+
+        start_is_bullish = data['close'].loc[start_index] >= data['open'].loc[start_index]
+        start_price = data['high'].loc[start_index] if start_is_bullish else data['low'].loc[start_index]
+        price_diff = abs(current_price - start_price) * 10000
+
+        if price_diff >= threshold and price_diff < threshold * 5:
+            direction = 'up' if data['high'].iloc[i] > data['high'].loc[start_index] or (data['high'].iloc[i] > data['high'].iloc[i-1] and data['close'].iloc[i] > data['open'].iloc[i]) else 'down'
+            if j > 0 and legs[j-1]['direction'] == direction:
+                price_diff += legs[j-1]['length']
+                legs[j-1]['end'] = data.index[i]
+                legs[j-1]['end_value'] = current_price
+                legs[j-1]['length'] = price_diff
+                legs[j-1]['direction'] = direction
+                start_index = data.index[i]
+            elif len(data.loc[start_index:data.index[i]]) >= 3:
+                if legs:
+                    row = data.loc[legs[-1]['end']]
+                    start_price = row['high'] if legs[-1]['direction'] == 'up' else row['low']
+                price_diff = abs(current_price - start_price) * 10000
+                legs.append({'start': start_index, 'start_value': start_price, 'end': data.index[i],
+                             'end_value': current_price, 'length': price_diff, 'direction': direction})
+                j += 1
+                start_index = data.index[i]
+
+        elif j > 0 and legs[j-1]['direction'] == 'up' and data['high'].iloc[i] >= data['high'].loc[start_index] and price_diff < threshold:
+            if j > 1:
+                price_diff = reference_price_diff(data, j, current_price, legs)
+            else:
+                price_diff += legs[j-1]['length']
+            start_index = data.index[i]
+            legs[j-1]['end'] = data.index[i]
+            legs[j-1]['end_value'] = current_price
+            legs[j-1]['length'] = price_diff
+            legs[j-1]['direction'] = direction
+
+        elif j > 0 and legs[j-1]['direction'] == 'down' and data['low'].iloc[i] <= data['low'].loc[start_index] and price_diff < threshold:
+            if j > 1:
+                price_diff = reference_price_diff(data, j, current_price, legs)
+            else:
+                price_diff += legs[j-1]['length']
+            start_index = data.index[i]
+            legs[j-1]['end'] = data.index[i]
+            legs[j-1]['end_value'] = current_price
+            legs[j-1]['length'] = price_diff
+        i += 1
+    return legs
+
+
+def reference_price_diff(data, j, current_price, legs):
+    row = data.loc[legs[j-2]['end']]
+    return abs(current_price - (row['high'] if legs[j-2]['direction'] == 'up' else row['low'])) * 10000
+
+
+def reference_swing(data, legs):
+    """Original get_swing_points: (swing_type, is_swing) of a leg triple."""
+    if len(legs) != 3:
+        return None
+    up = legs[1]['end_value'] > legs[0]['start_value'] and legs[0]['end_value'] > legs[1]['end_value']
+    down = legs[1]['end_value'] < legs[0]['start_value'] and legs[0]['end_value'] < legs[1]['end_value']
+    if not (up or down):
+        return '', False
+    pullback = 'bearish' if up else 'bullish'
+    s_index = data.index.tolist().index(legs[1]['start'])
+    e_index = data.index.tolist().index(legs[1]['end'])
+    true_candles = 0
+    first_candle = False
+    for k in range(s_index, e_index + 1):
+        if data.iloc[k]['status'] == pullback:
+            close = data.iloc[k]['close']
+            if first_candle and (close < last_close if up else close > last_close):
+                true_candles += 1
+                last_close = close
+            elif not first_candle:
+                last_close = close
+            first_candle = True
+    if true_candles >= 3:
+        return ('bullish' if up else 'bearish'), True
+    return '', False
+
+
+# ---------- Data ----------
+@lru_cache(maxsize=None)
+def make_bars(n, seed=0):
+    """Random-walk M1 bars quantised to 5 digits, so equal highs/lows occur."""
+    rng = np.random.default_rng(seed)
+    c = 1.08 + np.cumsum(rng.normal(0, 0.00015, n))
+    o = np.r_[c[0], c[:-1]] + rng.normal(0, 0.00003, n)
+    h = np.maximum(o, c) + np.abs(rng.normal(0, 0.0001, n))
+    l = np.minimum(o, c) - np.abs(rng.normal(0, 0.0001, n))
+    o, h, l, c = (np.round(x, 5) for x in (o, h, l, c))
+    index = pd.date_range('2024-01-01', periods=n, freq='min', tz='Asia/Tehran')
+    data = pd.DataFrame({'open': o, 'high': h, 'low': l, 'close': c}, index=index)
+    data['timestamp'] = data.index
+    data['status'] = np.where(data['open'] > data['close'], 'bearish', 'bullish')
+    return data
+
+
+@lru_cache(maxsize=None)
+def expected_legs(seed, threshold):
+    """Reference legs of make_bars(400, seed), with bar positions."""
+    data = make_bars(400, seed)
+    return with_positions(data, reference_legs(data, threshold))
+
+
+def with_positions(data, legs):
+    return [dict(leg, start_pos=data.index.get_loc(leg['start']), end_pos=data.index.get_loc(leg['end']))
+            for leg in legs]
+
+
+def as_dicts(legs):
+    return [leg.to_dict() for leg in legs]
+
+
+# ---------- Tests ----------
+def test_get_legs_matches_reference():
+    for seed in SEEDS:
+        data = make_bars(400, seed)
+        for threshold in THRESHOLDS:
+            expected = expected_legs(seed, threshold)
+            assert expected, f"seed {seed}: no legs to compare"
+            assert as_dicts(get_legs(data, threshold)) == expected, f"seed {seed} threshold {threshold}"
+
+
+def test_leg_equality():
+    leg = get_legs(make_bars(400, 0), 6)[0]
+    assert leg == leg.copy() and leg.to_dict() == leg.copy().to_dict()
+    other = leg.copy()
+    other['end_pos'] += 1
+    assert leg != other
+    # dict هرگز با Leg برابر نیست، حتی با کلیدهای مشترک (تقارن ==)
+    assert leg != {'start': leg.start} and {'start': leg.start} != leg
+    assert leg != leg.to_dict() and leg.to_dict() != leg
+
+
+def test_array_kernels_match_get_legs():
+    data = make_bars(1500, 99)
+    arrays = [data[k].to_numpy() for k in ('open', 'high', 'low', 'close')]
+    multi = get_legs_arrays_multi(*arrays, THRESHOLDS, index=data.index)
+    for threshold in THRESHOLDS:
+        expected = as_dicts(get_legs(data, threshold))
+        assert as_dicts(get_legs_arrays(*arrays, index=data.index, custom_threshold=threshold)) == expected
+        assert as_dicts(multi[threshold]) == expected
+
+
+def test_tracker_matches_reference():
+    for seed in SEEDS:
+        data = make_bars(400, seed)
+        for threshold in THRESHOLDS:
+            expected = expected_legs(seed, threshold)
+            tracker = LegTracker(threshold, max_legs=None)
+            for k in range(len(data)):
+                tracker.update(data.iloc[k])
+            assert as_dicts(tracker.legs) == expected, f"update: seed {seed} threshold {threshold}"
+            # sync با پنجره‌ای که از اول داده شروع می‌شود: کندل آخر در حال شکل‌گیری است
+            tracker = LegTracker(threshold)
+            for end in range(360, len(data) + 1):
+                legs = tracker.sync(data.iloc[:end])
+            assert as_dicts(legs) == expected[-3:], f"sync: seed {seed} threshold {threshold}"
+
+
+def test_sync_rolling_window_is_full_history():
+    # پنجره 200 کندلی جابه‌جا می‌شود؛ لگ‌های tracker همان لگ‌های کل تاریخچه‌اند
+    data = make_bars(400, 4)
+    tracker = LegTracker(6)
+    for end in range(200, len(data) + 1):
+        window = data.iloc[end - 200:end]
+        legs = tracker.sync(window)
+    full = get_legs(data, 6)[-3:]
+    offset = len(data) - 200
+    assert [(leg.start, leg.end, leg.start_pos + offset, leg.end_pos + offset, leg.length) for leg in legs] == \
+        [(leg.start, leg.end, leg.start_pos, leg.end_pos, leg.length) for leg in full]
+
+
+def test_legs_2d_positions_are_columns():
+    rng = np.random.default_rng(5)
+    rows = [make_bars(600, seed) for seed in (1, 2, 3)]
+    matrices = [np.stack([r[k].to_numpy() for r in rows]) for k in ('open', 'high', 'low', 'close')]
+    missing = rng.random(600) < 0.05
+    for m in matrices:
+        m[1, missing] = np.nan  # نماد دوم بعضی کندل‌ها را ندارد
+        m[2, :40] = np.nan
+    result = get_legs_arrays_2d(*matrices, pip_factors=[10000, 10000, 10000], custom_threshold=6)
+    for symbol, legs in enumerate(result):
+        quoted = ~np.isnan(matrices[0][symbol])
+        columns = np.flatnonzero(quoted)
+        expected = get_legs_arrays(*(m[symbol][quoted] for m in matrices), custom_threshold=6)
+        assert len(legs) == len(expected) > 0
+        for leg, ref in zip(legs, expected):
+            assert (leg.start_pos, leg.end_pos) == (columns[ref.start_pos], columns[ref.end_pos])
+            assert (leg.start, leg.end) == (leg.start_pos, leg.end_pos)
+            assert (leg.start_value, leg.end_value, leg.length, leg.direction) == \
+                (ref.start_value, ref.end_value, ref.length, ref.direction)
+
+
+def test_swings_match_reference():
+    found = 0
+    for seed in SEEDS:
+        data = make_bars(400, seed)
+        for threshold in THRESHOLDS:
+            legs = get_legs(data, threshold)
+            reference = expected_legs(seed, threshold)
+            expected = [reference_swing(data, reference[k:k + 3])
+                        for k in range(len(legs) - 2)]
+            assert [get_swing_points(data, legs[k:k + 3]) for k in range(len(legs) - 2)] == expected
+            events = scan_swings(legs_to_array(legs), data['close'].to_numpy(), data['status'].to_numpy())
+            assert events['triple'].tolist() == [k for k, (_, is_swing) in enumerate(expected) if is_swing]
+            found += len(events)
+    assert found > 0
+
+
+def run_all_tests():
+    tests = [test_get_legs_matches_reference, test_leg_equality, test_array_kernels_match_get_legs,
+             test_tracker_matches_reference, test_sync_rolling_window_is_full_history,
+             test_legs_2d_positions_are_columns, test_swings_match_reference]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
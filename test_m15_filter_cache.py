@@ -0,0 +1,117 @@
+"""
+تست M15FilterCache: کلید کش زمان آخرین کندل M15 تکمیل‌شده بروکر است (از
+aggregator اگر به‌روز باشد، وگرنه از بروکر) و هرگز ساعت سیستم.
+"""
+
+import sys
+
+import numpy as np
+
+import bar_aggregator
+import m15_filter_strategy
+from bar_aggregator import BarAggregator
+from bar_store import RATES_DTYPE
+from m15_filter_strategy import M15FilterCache
+
+SYMBOL = 'TESTM15'
+T0 = 1_700_000_100 // 900 * 900
+
+
+def make_m15(n, seed=0):
+    """M15 rates, last row = forming candle."""
+    rng = np.random.default_rng(seed)
+    close = 1.08 + np.cumsum(rng.normal(0, 0.0008, n))
+    rates = np.zeros(n, RATES_DTYPE)
+    rates['time'] = T0 + np.arange(n) * 900
+    rates['open'] = np.r_[close[0], close[:-1]]
+    rates['close'] = close
+    rates['high'] = np.maximum(rates['open'], close) + 0.0003
+    rates['low'] = np.minimum(rates['open'], close) - 0.0003
+    rates['tick_volume'] = 100
+    return rates
+
+
+class Broker:
+    """copy_rates_from_pos over self.rates (M15 only), counting calls."""
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.calls = 0
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        self.calls += 1
+        end = len(self.rates) - start_pos
+        return self.rates[max(end - count, 0):end].copy()
+
+
+def run_with(broker, fn):
+    real = m15_filter_strategy.mt5.copy_rates_from_pos, m15_filter_strategy.log
+    m15_filter_strategy.mt5.copy_rates_from_pos = broker.copy_rates_from_pos
+    m15_filter_strategy.log = lambda *args, **kwargs: None  # بدون فایل swing_logs در مخزن
+    try:
+        return fn()
+    finally:
+        m15_filter_strategy.mt5.copy_rates_from_pos, m15_filter_strategy.log = real
+        bar_aggregator._aggregators.pop((SYMBOL, 900), None)
+
+
+def test_key_from_broker_without_aggregator():
+    broker = Broker(make_m15(40))
+    cache = M15FilterCache()
+
+    def check():
+        assert cache._key(SYMBOL) == int(broker.rates['time'][-2])
+        first = cache.get(SYMBOL)
+        assert first is not None and cache.get(SYMBOL) is not None
+        assert cache.stats()['misses'] == 1 and cache.stats()['hits'] == 1
+        broker.rates = make_m15(41)  # کندل M15 جدید تکمیل شد
+        cache.get(SYMBOL)
+        assert cache.stats()['misses'] == 2
+        assert cache._entries[SYMBOL][1]['time'].timestamp() == int(broker.rates['time'][-2])
+    run_with(broker, check)
+
+
+def test_stale_aggregator_not_used_as_key():
+    broker = Broker(make_m15(40))
+    cache = M15FilterCache()
+
+    def check():
+        agg = bar_aggregator.get_aggregator(SYMBOL, 900, create=True)
+        agg.seed(broker.rates[:-10])  # aggregator عقب مانده است
+        agg.last_seen = int(broker.rates['time'][-1])
+        assert agg.completed(1) is None
+        assert cache._key(SYMBOL) == int(broker.rates['time'][-2])
+        # aggregator به‌روز: کلید بدون درخواست به بروکر
+        agg.seed(broker.rates[:-1])
+        calls = broker.calls
+        assert cache._key(SYMBOL) == int(broker.rates['time'][-2])
+        assert broker.calls == calls
+    run_with(broker, check)
+
+
+def test_no_key_without_data():
+    broker = Broker(np.zeros(0, RATES_DTYPE))
+    cache = M15FilterCache()
+
+    def check():
+        assert cache._key(SYMBOL) is None
+        assert cache.get(SYMBOL) is None
+    run_with(broker, check)
+
+
+def run_all_tests():
+    tests = [test_key_from_broker_without_aggregator, test_stale_aggregator_not_used_as_key,
+             test_no_key_without_data]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
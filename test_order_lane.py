@@ -0,0 +1,144 @@
+"""
+تست OrderLane: فراخوانی روی thread سفارش‌ها انجام می‌شود ولی نتیجه (callback،
+باطل کردن snapshot، حذف از pending) فقط در poll روی thread اصلی اعمال می‌شود.
+"""
+
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import MetaTrader5 as mt5
+
+from order_lane import MT5_LOCK, OrderLane, guard_mt5
+
+
+class FakeSnapshot:
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate(self, *names):
+        self.invalidated.append((threading.get_ident(), names))
+
+
+class FakeConnector:
+    """Records the thread of each call; open blocks until `release` is set."""
+
+    def __init__(self):
+        self.snapshot = FakeSnapshot()
+        self.release = threading.Event()
+        self.release.set()
+        self.threads = []
+
+    def open_buy_position(self, **kwargs):
+        self.threads.append(threading.get_ident())
+        self.release.wait(5)
+        return SimpleNamespace(retcode=10009, order=1, price=1.1, volume=kwargs.get('volume'))
+
+    def open_sell_position(self, **kwargs):
+        raise RuntimeError("terminal gone")
+
+    def modify_sl_tp(self, ticket, new_sl=None, new_tp=None):
+        return SimpleNamespace(retcode=10016)
+
+    def close_all_positions(self):
+        return True
+
+
+def test_results_applied_on_main_thread():
+    conn = FakeConnector()
+    conn.release.clear()
+    lane = OrderLane(conn, asynchronous=True)
+    seen = []
+    future = lane.open_position('buy', callback=lambda r: seen.append((threading.get_ident(), r.retcode)),
+                                volume=0.1)
+    assert lane.pending('open', 'buy') == 1
+    conn.release.set()
+    future.result(5)
+    # کار worker تمام شده ولی تا poll هنوز pending است و چیزی اعمال نشده
+    assert lane.pending('open') == 1
+    assert not seen and not conn.snapshot.invalidated
+    assert conn.threads[0] != threading.get_ident()
+    assert lane.poll() == 1
+    main = threading.get_ident()
+    assert seen == [(main, 10009)]
+    assert conn.snapshot.invalidated == [(main, ('positions', 'account'))]
+    assert lane.pending() == 0
+    assert lane.latencies[-1]['retcode'] == 10009
+    lane.shutdown()
+
+
+def test_failed_call_reports_none():
+    lane = OrderLane(FakeConnector(), asynchronous=True)
+    seen = []
+    lane.open_position('sell', callback=seen.append).result(5)
+    lane.shutdown()
+    assert seen == [None]
+    assert lane.pending() == 0
+
+
+def test_submission_order():
+    conn = FakeConnector()
+    lane = OrderLane(conn, asynchronous=True)
+    seen = []
+    lane.modify_sl_tp(5, new_sl=1.0, callback=lambda r: seen.append('modify'))
+    lane.close_all(callback=lambda r: seen.append('close_all'))
+    lane.shutdown()
+    assert seen == ['modify', 'close_all']
+
+
+def test_synchronous_applies_at_once():
+    conn = FakeConnector()
+    lane = OrderLane(conn, asynchronous=False)
+    seen = []
+    future = lane.open_position('buy', callback=seen.append, volume=0.2)
+    assert future.done() and future.result().volume == 0.2
+    assert len(seen) == 1 and lane.pending() == 0
+    assert conn.threads == [threading.get_ident()]
+
+
+def test_reads_not_blocked_by_order_send():
+    guard_mt5()
+    inside, release = threading.Event(), threading.Event()
+
+    def order_send():  # worker داخل order_send، منتظر بروکر
+        with MT5_LOCK:
+            inside.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=order_send)
+    worker.start()
+    inside.wait(5)
+    reconnect = threading.Thread(target=mt5.shutdown)
+    try:
+        started = time.perf_counter()
+        mt5.symbol_info_tick('EURUSD')
+        mt5.positions_get()
+        mt5.account_info()
+        assert time.perf_counter() - started < 1
+        reconnect.start()
+        reconnect.join(0.2)
+        assert reconnect.is_alive()  # قطع/اتصال منتظر پایان سفارش می‌ماند
+    finally:
+        release.set()
+        worker.join()
+    reconnect.join(5)
+    assert not reconnect.is_alive()
+
+
+def run_all_tests():
+    tests = [test_results_applied_on_main_thread, test_failed_call_reports_none, test_submission_order,
+             test_synchronous_applies_at_once, test_reads_not_blocked_by_order_send]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
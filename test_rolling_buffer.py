@@ -0,0 +1,94 @@
+"""
+تست بافر کندل MT5Connector.get_rates: بعد از بارگذاری اول فقط کندل‌های جدید
+گرفته می‌شود و بافر با دریافت کامل برابر است؛ اگر بروکر کندل کافی تا آخرین
+کندل بافر نداشته باشد، حلقه تمام می‌شود و بافر از نو بارگذاری می‌شود.
+"""
+
+import sys
+
+import numpy as np
+
+import MetaTrader5 as mt5
+
+import mt5_connector
+from bar_store import RATES_DTYPE
+
+T0 = 1_700_000_040
+
+
+def make_rates(start, n):
+    rates = np.zeros(n, RATES_DTYPE)
+    rates['time'] = T0 + (start + np.arange(n)) * 60
+    rates['close'] = 1.08 + (start + np.arange(n)) * 1e-5
+    rates['open'] = rates['high'] = rates['low'] = rates['close']
+    rates['tick_volume'] = 1
+    return rates
+
+
+class Broker:
+    """copy_rates_from_pos over self.rates (last row = forming bar), counting calls."""
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.calls = 0
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        self.calls += 1
+        assert self.calls < 50, "get_rates does not terminate"
+        return self.rates[max(len(self.rates) - count, 0):].copy()
+
+
+def get_rates(conn, broker, count=200):
+    real = mt5_connector.mt5.copy_rates_from_pos
+    mt5_connector.mt5.copy_rates_from_pos = broker.copy_rates_from_pos
+    try:
+        return conn.get_rates(mt5.TIMEFRAME_M1, count)
+    finally:
+        mt5_connector.mt5.copy_rates_from_pos = real
+
+
+def connector():
+    conn = mt5_connector.MT5Connector()
+    conn.bar_store = None
+    conn.aggregate_periods = []
+    return conn
+
+
+def test_catch_up_matches_full_copy():
+    history = make_rates(0, 400)
+    conn = connector()
+    broker = Broker(history[:250])
+    get_rates(conn, broker)
+    for end in (251, 252, 260, 300):  # یک، دو و چند کندل جاافتاده
+        broker.rates = history[:end]
+        rates = get_rates(conn, broker)
+        assert np.array_equal(rates, history[end - 200:end]), end
+
+
+def test_short_broker_history_reloads():
+    conn = connector()
+    broker = Broker(make_rates(0, 250))
+    get_rates(conn, broker)
+    # بروکر بعد از قطعی فقط 5 کندل دارد که به آخرین کندل بافر نمی‌رسد
+    broker.rates = make_rates(260, 5)
+    broker.calls = 0
+    rates = get_rates(conn, broker)
+    assert np.array_equal(rates, broker.rates)
+    assert broker.calls <= 3
+
+
+def run_all_tests():
+    tests = [test_catch_up_matches_full_copy, test_short_broker_history_reloads]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
@@ -0,0 +1,95 @@
+"""
+تست SymbolSpecCache: مشخصات نماد تا پایان ttl از حافظه خوانده می‌شود،
+invalidate و refresh خواندن دوباره را اجبار می‌کنند و خطا کش نمی‌شود.
+"""
+
+import sys
+from types import SimpleNamespace
+
+import symbol_spec
+from symbol_spec import SymbolSpec, SymbolSpecCache
+
+
+class Terminal:
+    """symbol_info for EURUSD / USDJPY, counting calls; `down` makes it fail."""
+
+    def __init__(self):
+        self.calls = 0
+        self.down = False
+        self.digits = {'EURUSD': 5, 'USDJPY': 3}
+
+    def symbol_info(self, symbol):
+        self.calls += 1
+        if self.down or symbol not in self.digits:
+            return None
+        digits = self.digits[symbol]
+        point = 10.0 ** -digits
+        return SimpleNamespace(name=symbol, digits=digits, point=point, trade_tick_size=point,
+                               trade_tick_value=None, trade_contract_size=100000, trade_stops_level=10,
+                               volume_step=0.01, volume_min=0.01, volume_max=50.0, filling_mode=3, visible=True)
+
+
+def with_terminal(fn):
+    terminal = Terminal()
+    real = symbol_spec.mt5.symbol_info
+    symbol_spec.mt5.symbol_info = terminal.symbol_info
+    try:
+        fn(terminal)
+    finally:
+        symbol_spec.mt5.symbol_info = real
+
+
+def test_ttl_and_invalidate():
+    def check(terminal):
+        cache = SymbolSpecCache(ttl=60)
+        spec = cache.get('EURUSD')
+        assert cache.get('EURUSD') is spec and terminal.calls == 1
+        spec.fetched_at -= 61  # ttl گذشته است
+        assert cache.get('EURUSD') is not spec and terminal.calls == 2
+        cache.invalidate('EURUSD')
+        cache.get('EURUSD')
+        cache.get('EURUSD', refresh=True)
+        assert terminal.calls == 4
+        assert cache.stats() == {'hits': 1, 'misses': 4, 'size': 1}
+    with_terminal(check)
+
+
+def test_failed_read_not_cached():
+    def check(terminal):
+        cache = SymbolSpecCache(ttl=60)
+        cache.get('EURUSD')
+        terminal.down = True
+        assert cache.get('EURUSD', refresh=True) is None
+        assert cache.stats()['size'] == 0
+        terminal.down = False
+        assert cache.get('EURUSD') is not None and terminal.calls == 3
+    with_terminal(check)
+
+
+def test_spec_values():
+    def check(terminal):
+        eur = SymbolSpec(terminal.symbol_info('EURUSD'))
+        jpy = SymbolSpec(terminal.symbol_info('USDJPY'))
+        assert abs(eur.pip_size - 0.0001) < 1e-12 and abs(jpy.pip_size - 0.01) < 1e-12
+        assert abs(eur.tick_value - 1.0) < 1e-9  # contract_size * tick_size
+        assert eur.round_price(1.234567) == 1.23457
+        assert abs(eur.normalize_volume(0.123) - 0.12) < 1e-12 and eur.normalize_volume(80) == 50.0
+        assert abs(eur.min_stop_distance() - 10 * eur.point) < 1e-12
+    with_terminal(check)
+
+
+def run_all_tests():
+    tests = [test_ttl_and_invalidate, test_failed_read_not_cached, test_spec_values]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ FAIL {test.__name__}: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
@@ -0,0 +1,110 @@
+import pytz
+
+from market_window import epoch_to_local
+
+TEHRAN_TZ = pytz.timezone('Asia/Tehran')
+
+
+class TickTouchDetector:
+    """
+    Fib 0.705 touch detection on the forming M1 bar, fed from
+    symbol_info_tick instead of waiting for the bar to close.
+
+    on_tick() keeps the forming bar's open/high/low/close from bid prices
+    (the prices MT5 builds its bars from). check() applies the phase 2/3
+    touch rule to that running bar: a bar that has already broken fib 0.0
+    or fib 1.0 never counts as a touch, exactly as at bar close.
+
+    status_mode decides how far the tick path may go:
+      'live'  - first and second touch fire intra-bar; the second touch
+                compares the forming bar's current direction with the first
+                touch bar's status (never the same bar), so the order can go
+                out on the touching tick.
+      'close' - only the first touch is recorded early; the second touch is
+                left to the closed-bar rules, so decisions are identical to
+                the closed-bar logic and only the latency is measured.
+
+    on_bar_close() replaces a provisional tick first touch by the closed bar
+    (final status) and returns when the touch was first seen by tick, so the
+    closed-bar lag can be logged.
+    """
+
+    def __init__(self, period=60, status_mode='live', fib_key='0.705', tz=None):
+        self.period = period
+        self.status_mode = status_mode
+        self.fib_key = fib_key
+        self.tz = tz or TEHRAN_TZ
+        self.bar = None
+        self.last_tick_time = None
+        self._seen = {}  # bar time -> زمان اولین تیکی که لمس را دید
+
+    def on_tick(self, tick):
+        """Fold one tick into the forming bar; returns the bar snapshot (dict like MarketWindow.bar)."""
+        if not tick:
+            return self.bar
+        t = tick.time_msc / 1000.0 if getattr(tick, 'time_msc', 0) else float(tick.time)
+        price = float(tick.bid)
+        bucket = int(t) // self.period * self.period
+        bar = self.bar
+        if bar is None or bucket != bar['time']:
+            if bar is not None and bucket < bar['time']:
+                return bar  # تیک قدیمی
+            bar = self.bar = {'time': bucket, 'timestamp': epoch_to_local(bucket, self.tz),
+                              'open': price, 'high': price, 'low': price, 'close': price}
+        else:
+            bar['high'] = max(bar['high'], price)
+            bar['low'] = min(bar['low'], price)
+            bar['close'] = price
+        bar['status'] = 'bearish' if bar['open'] > bar['close'] else 'bullish'
+        self.last_tick_time = t
+        return bar
+
+    def seed(self, bar):
+        """Start the forming bar from the broker's forming bar (true open), e.g. MarketWindow.bar(-1)."""
+        if self.bar is None or bar['time'] >= self.bar['time']:
+            self.bar = {k: bar[k] for k in ('time', 'timestamp', 'open', 'high', 'low', 'close', 'status')}
+
+    def check(self, state, swing_type):
+        """Apply the touch rule to the forming bar; returns 'first', 'second' or None."""
+        fib = state.fib_levels
+        bar = self.bar
+        if not fib or bar is None or state.second_touch:
+            return None
+        if swing_type == 'bullish':
+            if bar['high'] > fib['0.0'] or bar['low'] < fib['1.0']:
+                return None
+            touched = bar['low'] <= fib[self.fib_key]
+        elif swing_type == 'bearish':
+            if bar['low'] < fib['0.0'] or bar['high'] > fib['1.0']:
+                return None
+            touched = bar['high'] >= fib[self.fib_key]
+        else:
+            return None
+        if not touched:
+            return None
+
+        self._seen.setdefault(bar['time'], self.last_tick_time)
+        if not state.first_touch:
+            state.first_touch = True
+            state.first_touch_value = dict(bar, tick=True)
+            return 'first'
+        first = state.first_touch_value
+        if (self.status_mode == 'live' and first['time'] != bar['time']
+                and bar['status'] != first['status']):
+            state.second_touch = True
+            state.second_touch_value = dict(bar, tick=True)
+            return 'second'
+        return None
+
+    def on_bar_close(self, state, last_bar):
+        """
+        Called with the closed bar before the closed-bar rules run. Returns the
+        tick time at which this bar was first seen touching, or None.
+        """
+        first = state.first_touch_value
+        if first is not None and first.get('tick') and first['time'] == last_bar['time']:
+            state.first_touch_value = last_bar
+        seen = self._seen.pop(last_bar['time'], None)
+        for t in [t for t in self._seen if t < last_bar['time']]:
+            del self._seen[t]
+        return seen